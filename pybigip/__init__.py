@@ -3,7 +3,12 @@ pybigip - A library for managing f5 bigip appliances.
 '''
 
 
-from bigsuds import BIGIP
+import Queue
+import threading
+from contextlib import contextmanager
+from itertools import chain
+from bigsuds import BIGIP, OperationFailed
+from pybigip import core, instrument
 
 
 class Connection(BIGIP):
@@ -11,3 +16,277 @@ class Connection(BIGIP):
     Wrapper around bigsuds connection class to help abstract us from future
     backend library changes (iControl REST?).
     '''
+    chunk_size = None
+    workers = 1
+    config_marker_variable = 'configsync.localconfigtime'
+    hooks = ()
+
+    def __init__(self, hostname, *args, **kwargs):
+        '''
+        Accepts the same arguments as L{bigsuds.BIGIP} plus:
+
+        @keyword chunk_size: Maximum number of items sent in one array
+            iControl call by L{call_chunked}, None to never split calls.
+        @keyword workers: Maximum number of chunks in flight at once. A
+            single bigsuds session is not safe to share between threads,
+            so this should stay 1 unless the connection hands out one
+            session per call.
+        @keyword hooks: list of L{instrument.Hook} objects receiving every
+            iControl call and object cache lookup.
+        '''
+        self.chunk_size = kwargs.pop('chunk_size', None)
+        self.workers = kwargs.pop('workers', 1)
+        self.hooks = list(kwargs.pop('hooks', ()))
+        super(Connection, self).__init__(hostname, *args, **kwargs)
+
+    def _create_client_wrapper(self, client, wsdl_name):
+        wrapper = super(Connection, self)._create_client_wrapper(client,
+                                                                 wsdl_name)
+        return instrument.Interface(self, wsdl_name, wrapper)
+
+    def with_session_id(self, session_id=None):
+        '''
+        Same as L{bigsuds.BIGIP.with_session_id}, calls through the new
+        session are reported to the hooks of this connection.
+        '''
+        return instrument.Proxy(
+                self, super(Connection, self).with_session_id(session_id))
+
+    def add_hook(self, hook):
+        '''
+        @param hook: L{instrument.Hook} to report calls to.
+        '''
+        self.hooks = self.hooks + [hook]
+
+    def remove_hook(self, hook):
+        '''
+        @param hook: previously added L{instrument.Hook}
+        '''
+        self.hooks = [h for h in self.hooks if h is not hook]
+
+    @contextmanager
+    def measure(self, payload=False):
+        '''
+        Context manager measuring the iControl calls and cache lookups made
+        through this connection while the block runs, from any thread.
+
+        Example:
+            >>> with con.measure() as cost:
+            ...     pybigip.ltm.Pools(con).get_all(deep=True)
+            >>> print cost.report()
+
+        @keyword payload: also measure approximate payload sizes, costly
+            for large calls.
+        @return: L{instrument.Histogram} of the block.
+        '''
+        histogram = instrument.Histogram(payload=payload)
+        self.add_hook(histogram)
+
+        try:
+            yield histogram
+        finally:
+            self.remove_hook(histogram)
+
+    def call_chunked(self, method, *arrays, **kwargs):
+        '''
+        Call an iControl method taking parallel array arguments, splitting
+        the arrays into requests of at most `chunk_size` items. Chunks are
+        sent over up to `workers` concurrent calls and the results joined
+        back in order.
+
+        @param method: bound iControl method, eg. con.LocalLB.Pool.get_list
+        @param arrays: parallel array arguments for `method`
+        @keyword weights: optional per item weights used to size chunks,
+            eg. the member count of each pool for get_member_* calls.
+        @keyword join: optional callable merging the list of chunk results,
+            for methods that do not return one list entry per item.
+        @return: concatenated list of results, or None for methods without
+            a return value.
+        '''
+        weights = kwargs.pop('weights', None)
+        join = kwargs.pop('join', None)
+        count = len(arrays[0]) if arrays else 0
+        size = self.chunk_size
+
+        if not size or count == 0 or \
+                (weights is None and count <= size) or \
+                (weights is not None and sum(weights) <= size):
+            return method(*arrays)
+
+        def call(span):
+            start, end = span
+            return method(*[a[start:end] for a in arrays])
+
+        results = core.parallel_map(call,
+                                    core.split_chunks(count, size, weights),
+                                    self.workers)
+
+        if join is not None:
+            return join(results)
+
+        if all(r is None for r in results):
+            return None
+
+        return list(chain.from_iterable(results))
+
+    def config_marker(self):
+        '''
+        Read a cheap marker that changes whenever the bigip configuration
+        changes, the db variable named by `config_marker_variable`.
+
+        @return: marker value, or None when the bigip cannot provide one.
+        '''
+        if not self.config_marker_variable:
+            return None
+
+        try:
+            result = self.Management.DBVariable.query(
+                    [self.config_marker_variable])
+        except OperationFailed:
+            # Not supported by this bigip, stop asking.
+            self.config_marker_variable = None
+            return None
+
+        return result[0]['value']
+
+
+class ConnectionPool(Connection):
+    '''
+    Pool of L{Connection} sessions to one bigip. Every iControl method call
+    made through the pool borrows a free session for the duration of the
+    call, so a single ConnectionPool can be shared between threads and used
+    as the connection for any pybigip class.
+
+    Example:
+        >>> con = pybigip.ConnectionPool('ltm.example.company', 'admin',
+        ...                              'foobarbaz', size=8)
+        >>> pools = pybigip.ltm.Pools(con).get_all(deep=True)
+    '''
+    def __init__(self, hostname, *args, **kwargs):
+        '''
+        Accepts the same arguments as L{Connection} plus:
+
+        @keyword size: Maximum number of sessions to open. Also the default
+            for `workers`.
+        @keyword session_ids: Give each session its own iControl session id
+            (bigip 11.0+), needed when sessions run transactions.
+        '''
+        self.size = kwargs.pop('size', 4)
+        self._session_ids = kwargs.pop('session_ids', False)
+        kwargs.setdefault('workers', self.size)
+        super(ConnectionPool, self).__init__(hostname, *args, **kwargs)
+
+        self._free = Queue.Queue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+
+        ns = _PooledNamespace(self, attr)
+        setattr(self, attr, ns)
+        return ns
+
+    def _open(self):
+        '''
+        Create a new session to the bigip.
+        '''
+        con = BIGIP(self._hostname, self._username, self._password,
+                    self._debug, self._cachedir, self._verify,
+                    self._timeout, self._port)
+
+        if self._session_ids:
+            con = con.with_session_id()
+
+        return con
+
+    def acquire(self):
+        '''
+        Borrow a session, opening a new one while fewer than `size` are open
+        and blocking until one is released otherwise.
+
+        @return: bigsuds connection object
+        '''
+        try:
+            return self._free.get_nowait()
+        except Queue.Empty:
+            pass
+
+        with self._lock:
+            create = self._opened < self.size
+
+            if create:
+                self._opened += 1
+
+        if not create:
+            return self._free.get()
+
+        try:
+            return self._open()
+        except Exception:
+            with self._lock:
+                self._opened -= 1
+            raise
+
+    def release(self, con):
+        '''
+        Return a session borrowed with L{acquire}.
+        '''
+        self._free.put(con)
+
+    @contextmanager
+    def session(self):
+        '''
+        Context manager holding one session for several calls, eg. to run a
+        bigsuds Transaction.
+        '''
+        con = self.acquire()
+
+        try:
+            yield con
+        finally:
+            self.release(con)
+
+
+class _PooledNamespace(object):
+    '''
+    iControl namespace (LocalLB, GlobalLB, ...) of a L{ConnectionPool}.
+    '''
+    def __init__(self, pool, name):
+        self._pool = pool
+        self._name = name
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+
+        iface = _PooledInterface(self._pool, self._name, attr)
+        setattr(self, attr, iface)
+        return iface
+
+
+class _PooledInterface(object):
+    '''
+    iControl interface of a L{ConnectionPool}, each method call runs on a
+    borrowed session.
+    '''
+    def __init__(self, pool, namespace, name):
+        self._pool = pool
+        self._namespace = namespace
+        self._name = name
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+
+        def call(*args, **kwargs):
+            with self._pool.session() as con:
+                iface = getattr(getattr(con, self._namespace), self._name)
+                return getattr(iface, attr)(*args, **kwargs)
+
+        call = instrument.wrap(self._pool,
+                               '%s.%s' % (self._namespace, self._name), attr,
+                               call)
+        setattr(self, attr, call)
+        return call
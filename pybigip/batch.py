@@ -0,0 +1,234 @@
+'''
+Batched writes.
+
+Mutations are queued on a L{WriteBatch} and sent on commit, grouped by
+iControl method so every group goes out as one array call. Local caches
+are updated as soon as the call of a group succeeded.
+
+Example (Drain a node from several pools in one call):
+    >>> with pybigip.batch.WriteBatch(con, transaction=True) as batch:
+    ...     for member in pybigip.ltm.Nodes(con).get(name)[0].members:
+    ...         batch.set_member_enabled(member, False)
+'''
+
+from bigsuds import Transaction
+from collections import OrderedDict
+
+
+STATE_ENABLED = 'STATE_ENABLED'
+STATE_DISABLED = 'STATE_DISABLED'
+
+
+def state(enabled):
+    '''
+    @return: iControl EnabledState for a bool.
+    '''
+    return STATE_ENABLED if enabled else STATE_DISABLED
+
+
+class WriteBatch(object):
+    '''
+    Unit of work collecting bigip mutations.
+    '''
+    def __init__(self, con, transaction=False):
+        '''
+        @param con: L{pybigip.Connection} instance.
+        @keyword transaction: send the calls inside a System.Session
+            transaction on a dedicated session, rolled back on error.
+        '''
+        self._con = con
+        self.transaction = transaction
+        self._groups = OrderedDict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        if exc_type is None:
+            self.commit()
+
+    def __len__(self):
+        return sum(len(g['keys']) for g in self._groups.itervalues())
+
+    def add(self, interface, method, *values, **kwargs):
+        '''
+        Queue one item of an array iControl call.
+
+        @param interface: iControl interface, eg. 'LocalLB.Pool'
+        @param method: method name, eg. 'delete_pool'
+        @param values: one value per array argument of the method
+        @keyword on_commit: callable run after the batch was sent
+        '''
+        group = self._group(interface, method, len(values))
+        group['keys'].append(None)
+
+        for column, value in zip(group['args'], values):
+            column.append(value)
+
+        self._on_commit(group, kwargs.get('on_commit'))
+
+    def add_nested(self, interface, method, key, *values, **kwargs):
+        '''
+        Queue items of an iControl call whose first argument is a list of
+        object names and the others lists of per object lists, eg.
+        LocalLB.Pool.set_member_priority(pool_names, members[][],
+        priorities[][]). Items for the same object are merged.
+
+        @param interface: iControl interface, eg. 'LocalLB.Pool'
+        @param method: method name, eg. 'set_member_priority'
+        @param key: object name, eg. the pool name
+        @param values: one list per nested array argument
+        @keyword on_commit: callable run after the batch was sent
+        '''
+        group = self._group(interface, method, len(values) + 1)
+
+        if key not in group['index']:
+            group['index'][key] = len(group['keys'])
+            group['keys'].append(key)
+            group['args'][0].append(key)
+
+            for column in group['args'][1:]:
+                column.append(list())
+
+        i = group['index'][key]
+
+        for column, value in zip(group['args'][1:], values):
+            column[i].extend(value)
+
+        self._on_commit(group, kwargs.get('on_commit'))
+
+    def commit(self):
+        '''
+        Send every queued group as one array call. The commit callbacks of
+        a group run as soon as its call succeeded, so local caches follow
+        the bigip even when a later group fails. The batch is empty
+        afterwards.
+
+        @raise Exception: the error of the failed call. The failed group
+            and the groups not sent yet stay queued; in a transaction every
+            group does, as the transaction was rolled back. A failed group
+            split into chunks may have been partially applied.
+        '''
+        if self.transaction:
+            con = self._con.with_session_id()
+
+            with Transaction(con):
+                for (interface, method), group in self._groups.iteritems():
+                    self._method(con, interface, method)(*group['args'])
+
+            for key in self._groups.keys():
+                self._committed(key)
+        else:
+            for key in self._groups.keys():
+                interface, method = key
+                self._con.call_chunked(
+                        self._method(self._con, interface, method),
+                        *self._groups[key]['args'])
+                self._committed(key)
+
+    def pending(self):
+        '''
+        @return: list of (interface, method) keys of the queued groups, eg.
+            the groups left unsent by a failed L{commit}.
+        '''
+        return self._groups.keys()
+
+    def _committed(self, key):
+        for callback in self._groups.pop(key)['callbacks']:
+            callback()
+
+    def _group(self, interface, method, size):
+        key = (interface, method)
+
+        if key not in self._groups:
+            self._groups[key] = {'args': [list() for _ in xrange(size)],
+                                 'keys': list(),
+                                 'index': dict(),
+                                 'callbacks': list()}
+
+        return self._groups[key]
+
+    def _on_commit(self, group, callback):
+        if callback is not None:
+            group['callbacks'].append(callback)
+
+    @staticmethod
+    def _method(con, interface, method):
+        namespace, name = interface.split('.')
+        return getattr(getattr(getattr(con, namespace), name), method)
+
+    def create_pool(self, pool):
+        '''
+        Queue creation of a L{pybigip.ltm.Pool} with its members.
+        '''
+        self.add('LocalLB.Pool', 'create_v2', pool.name, pool.method,
+                 [m.to_dict() for m in pool.members],
+                 on_commit=pool._created)
+
+    def delete_pool(self, pool):
+        '''
+        Queue deletion of a L{pybigip.ltm.Pool}.
+        '''
+        self.add('LocalLB.Pool', 'delete_pool', pool.name,
+                 on_commit=pool._deleted)
+
+    def add_members(self, pool, members):
+        '''
+        Queue adding L{pybigip.ltm.Member} objects to a pool.
+        '''
+        self.add_nested('LocalLB.Pool', 'add_member_v2', pool.name,
+                        [m.to_dict() for m in members],
+                        on_commit=pool._members_changed)
+
+    def remove_members(self, pool, members):
+        '''
+        Queue removing L{pybigip.ltm.Member} objects from a pool.
+        '''
+        self.add_nested('LocalLB.Pool', 'remove_member_v2', pool.name,
+                        [m.to_dict() for m in members],
+                        on_commit=pool._members_changed)
+
+    def set_member_priority(self, member, value):
+        '''
+        Queue a pool member priority change.
+        '''
+        self.add_nested('LocalLB.Pool', 'set_member_priority',
+                        member.pool.name, [member.to_dict()], [value],
+                        on_commit=lambda: member.set_field('_priority',
+                                                           value))
+
+    def set_member_enabled(self, member, enabled):
+        '''
+        Queue enabling or disabling new sessions to a pool member.
+        '''
+        self.add_nested('LocalLB.Pool', 'set_member_session_enabled_state',
+                        member.pool.name, [member.to_dict()],
+                        [state(enabled)],
+                        on_commit=member._state_changed)
+
+    def set_member_monitor_state(self, member, enabled):
+        '''
+        Queue forcing a pool member down (disabled) or releasing it back to
+        its monitors (enabled).
+        '''
+        self.add_nested('LocalLB.Pool', 'set_member_monitor_state',
+                        member.pool.name, [member.to_dict()],
+                        [state(enabled)],
+                        on_commit=member._state_changed)
+
+    def set_vip_pool(self, vip, pool):
+        '''
+        Queue a L{pybigip.ltm.VirtualServer} default pool change.
+        '''
+        self.add('LocalLB.VirtualServer', 'set_default_pool_name', vip.name,
+                 pool.name, on_commit=lambda: vip._pool_changed(pool))
+
+    def set_datacenter_enabled(self, dc, enabled):
+        '''
+        Queue enabling or disabling a L{pybigip.gtm.Datacenter} in its
+        application.
+        '''
+        method = 'enable_application_context_object' if enabled else \
+                 'disable_application_context_object'
+        self.add('GlobalLB.Application', method, dc.context(),
+                 on_commit=lambda: dc._state_changed(enabled))
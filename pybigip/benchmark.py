@@ -0,0 +1,171 @@
+'''
+Benchmarks of pybigip hot paths against L{pybigip.fake.FakeBigIP}.
+
+Every case runs in a fresh process against a freshly generated config and
+reports round trips, array items sent, wall time and the peak memory
+growth of the case.
+
+Usage:
+    $ python -m pybigip.benchmark --scales 100,1000,10000 --latency 0.02
+'''
+
+import Queue
+import multiprocessing
+import optparse
+import resource
+import time
+from pybigip import fake, gtm, ltm
+
+
+def pools_deep(con):
+    ltm.Pools(con).get_all(deep=True)
+
+
+def node_pools(con):
+    for node in ltm.Nodes(con).get_all():
+        node.pools
+
+
+def pool_virtual_servers(con):
+    for pool in ltm.Pools(con).get_all():
+        pool.virtual_servers
+
+
+def applications_deep(con):
+    gtm.Applications(con).get_all(deep=True)
+
+
+def wideips_deep(con):
+    gtm.WideIPs(con).get_all(deep=True)
+
+
+CASES = (
+    ('Pools.get_all(deep=True)', pools_deep),
+    ('Node.pools', node_pools),
+    ('Pool.virtual_servers', pool_virtual_servers),
+    ('Applications.get_all(deep=True)', applications_deep),
+    ('WideIPs.get_all(deep=True)', wideips_deep),
+)
+
+
+def run_case(func, scale, options):
+    '''
+    Run one benchmark case in the current process.
+
+    @param func: callable taking a connection
+    @param scale: number of pools, virtual servers, applications and wide
+        ips in the generated config.
+    @param options: dict of L{fake.FakeBigIP} keyword arguments
+    @return: dict with 'round_trips', 'items', 'seconds' and 'peak_kb'.
+    '''
+    con = fake.FakeBigIP(pools=scale, apps=scale, wideips=scale, **options)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    func(con)
+    seconds = time.time() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return {'round_trips': con.round_trips, 'items': con.items,
+            'seconds': seconds, 'peak_kb': peak - baseline}
+
+
+def _child(queue, func, scale, options):
+    queue.put(run_case(func, scale, options))
+
+
+def _wait(queue, child, timeout):
+    '''
+    Wait for the result of a benchmark child process.
+
+    @return: result dict, or a dict with an 'error' message if the child
+        died or ran out of time.
+    '''
+    deadline = time.time() + timeout
+
+    while True:
+        try:
+            return queue.get(timeout=1)
+        except Queue.Empty:
+            pass
+
+        if not child.is_alive():
+            try:
+                return queue.get(timeout=1)
+            except Queue.Empty:
+                return {'error': 'exited with code %s' % child.exitcode}
+
+        if time.time() > deadline:
+            child.terminate()
+            return {'error': 'timed out after %ds' % timeout}
+
+
+def run(scales=(100, 1000, 10000), cases=CASES, timeout=600, **options):
+    '''
+    Run every case at every scale, each in its own process.
+
+    @keyword scales: list of config sizes
+    @keyword cases: list of (name, callable) tuples
+    @keyword timeout: seconds a case may run before it is killed.
+    @keyword options: L{fake.FakeBigIP} keyword arguments, eg. latency
+    @return: generator of (name, scale, result) tuples, see L{run_case}.
+        Failed cases have a result with only an 'error' message.
+    '''
+    for name, func in cases:
+        for scale in scales:
+            queue = multiprocessing.Queue()
+            child = multiprocessing.Process(target=_child,
+                                            args=(queue, func, scale,
+                                                  options))
+            child.start()
+            result = _wait(queue, child, timeout)
+            child.join()
+            yield name, scale, result
+
+
+def main(argv=None):
+    '''
+    Command line entry point.
+    '''
+    parser = optparse.OptionParser(usage='%prog [options]')
+    parser.add_option('--scales', default='100,1000,10000',
+                      help='comma separated config sizes [%default]')
+    parser.add_option('--case', action='append', dest='cases',
+                      help='only run cases containing this text')
+    parser.add_option('--members', type='int', default=4,
+                      help='members per pool [%default]')
+    parser.add_option('--latency', type='float', default=0.0,
+                      help='seconds added to every call [%default]')
+    parser.add_option('--item-latency', type='float', default=0.0,
+                      help='seconds added per array item [%default]')
+    parser.add_option('--chunk-size', type='int', default=None,
+                      help='items per iControl call')
+    parser.add_option('--workers', type='int', default=1,
+                      help='concurrent chunks per call [%default]')
+    parser.add_option('--timeout', type='float', default=600,
+                      help='seconds before a case is killed [%default]')
+    options, args = parser.parse_args(argv)
+
+    cases = [c for c in CASES if not options.cases or
+             any(text in c[0] for text in options.cases)]
+    scales = [int(s) for s in options.scales.split(',')]
+
+    print '%-34s %7s %11s %11s %10s %10s' % (
+            'case', 'scale', 'round trips', 'items', 'seconds', 'peak KiB')
+
+    for name, scale, result in run(scales, cases, options.timeout,
+                                   members=options.members,
+                                   latency=options.latency,
+                                   item_latency=options.item_latency,
+                                   chunk_size=options.chunk_size,
+                                   workers=options.workers):
+        if 'error' in result:
+            print '%-34s %7d failed: %s' % (name, scale, result['error'])
+            continue
+
+        print '%-34s %7d %11d %11d %10.3f %10d' % (
+                name, scale, result['round_trips'], result['items'],
+                result['seconds'], result['peak_kb'])
+
+
+if __name__ == '__main__':
+    main()
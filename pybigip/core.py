@@ -2,44 +2,581 @@
 Generic utilities.
 '''
 
+import sys
+import threading
+import time
+import Queue
+from collections import OrderedDict
+from contextlib import contextmanager
+from pybigip import instrument
+
+
+_attach = threading.local()
+
+
+def attached_connection():
+    '''
+    Get the connection objects unpickled inside L{attach} reattach to.
+
+    @return: connection, or None outside of L{attach}.
+    '''
+    return getattr(_attach, 'con', None)
+
+
+@contextmanager
+def attach(con):
+    '''
+    Context manager reattaching every pybigip object unpickled inside it to
+    `con`, their __setstate__ reads it with L{attached_connection}.
+
+    @param con: L{Connection} instance.
+    '''
+    previous = attached_connection()
+    _attach.con = con
+
+    try:
+        yield con
+    finally:
+        _attach.con = previous
+
+
+def parallel_map(func, items, workers=1):
+    '''
+    Apply `func` to every item of `items` using at most `workers` threads.
+    The first exception raised by `func` is re-raised in the caller once the
+    running calls finish.
+
+    @param func: callable taking one item
+    @param items: iterable of items
+    @keyword workers: maximum number of concurrent calls
+    @return: list of results, in the order of `items`.
+    '''
+    items = list(items)
+
+    if workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+
+    results = [None] * len(items)
+    errors = list()
+    queue = Queue.Queue()
+
+    for entry in enumerate(items):
+        queue.put(entry)
+
+    def worker():
+        while not errors:
+            try:
+                i, item = queue.get_nowait()
+            except Queue.Empty:
+                return
+
+            try:
+                results[i] = func(item)
+            except Exception:
+                errors.append(sys.exc_info())
+                return
+
+    threads = [threading.Thread(target=worker)
+               for _ in xrange(min(workers, len(items)))]
+
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0][0], errors[0][1], errors[0][2]
+
+    return results
+
+
+def split_chunks(count, size, weights=None):
+    '''
+    Split `count` items into consecutive (start, end) ranges holding at most
+    `size` items each. When `weights` is given a range holds items until
+    their summed weight reaches `size`, a single item heavier than `size`
+    gets a range of its own.
+
+    @param count: number of items
+    @param size: maximum items (or weight) per range
+    @keyword weights: optional list of per item weights
+    @return: list of (start, end) tuples
+    '''
+    if weights is None:
+        return [(i, min(i + size, count)) for i in xrange(0, count, size)]
+
+    ranges = list()
+    start = 0
+    total = 0
+
+    for i, weight in enumerate(weights):
+        if i > start and total + weight > size:
+            ranges.append((start, i))
+            start = i
+            total = 0
+
+        total += weight
+
+    if start < count:
+        ranges.append((start, count))
+
+    return ranges
+
+
+class Timeout(Exception):
+    '''
+    Raised when waiting on a L{Future} times out.
+    '''
+
+
+class Future(object):
+    '''
+    Result of a call submitted to an L{Executor}.
+    '''
+    def __init__(self):
+        ''' '''
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = list()
+        self._result = None
+        self._exc_info = None
+
+    def done(self):
+        '''
+        @return: True once the call finished.
+        '''
+        return self._event.is_set()
+
+    def result(self, timeout=None):
+        '''
+        Wait for the call to finish.
+
+        @keyword timeout: seconds to wait, None to wait forever.
+        @return: value returned by the call, exceptions raised by the call
+            are re-raised here.
+        @raise Timeout: when the call did not finish in time.
+        '''
+        if not self._event.wait(timeout):
+            raise Timeout('call did not finish in %s seconds' % timeout)
+
+        if self._exc_info:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+
+        return self._result
+
+    def exception(self, timeout=None):
+        '''
+        Wait for the call to finish.
+
+        @return: exception raised by the call, or None.
+        '''
+        if not self._event.wait(timeout):
+            raise Timeout('call did not finish in %s seconds' % timeout)
+
+        return self._exc_info[1] if self._exc_info else None
+
+    def add_done_callback(self, func):
+        '''
+        Call `func` with this future once the call finished. The callback runs
+        on the worker thread, or immediately if the call already finished.
+        '''
+        with self._lock:
+            if not self.done():
+                self._callbacks.append(func)
+                return
+
+        func(self)
+
+    def set_result(self, result):
+        ''' '''
+        self._result = result
+        self._finish()
+
+    def set_exception(self, exc_info):
+        '''
+        @param exc_info: sys.exc_info() tuple
+        '''
+        self._exc_info = exc_info
+        self._finish()
+
+    def _finish(self):
+        with self._lock:
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, list()
+
+        for func in callbacks:
+            func(self)
+
+
+class Executor(object):
+    '''
+    Run calls on up to `workers` daemon threads, started as work arrives and
+    exiting after `idle_timeout` seconds without work.
+    '''
+    def __init__(self, workers=1, idle_timeout=60):
+        '''
+        @keyword workers: maximum number of worker threads.
+        @keyword idle_timeout: seconds an idle worker thread waits for work
+            before exiting, None to keep it until L{shutdown}.
+        '''
+        self.workers = max(workers, 1)
+        self.idle_timeout = idle_timeout
+        self._queue = Queue.Queue()
+        self._threads = list()
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+    def submit(self, func, *args, **kwargs):
+        '''
+        Schedule `func(*args, **kwargs)`.
+
+        @return: L{Future} for the call.
+        @raise RuntimeError: after L{shutdown}.
+        '''
+        future = Future()
+
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError('executor is shut down')
+
+            self._queue.put((future, func, args, kwargs))
+
+            if len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run)
+                thread.daemon = True
+                self._threads.append(thread)
+                thread.start()
+
+        return future
+
+    def shutdown(self, wait=True):
+        '''
+        Stop accepting calls and let the worker threads exit once the calls
+        already submitted finished.
+
+        @keyword wait: block until the worker threads exited.
+        '''
+        with self._lock:
+            self._shutdown = True
+            threads = list(self._threads)
+
+            for _ in threads:
+                self._queue.put(None)
+
+        if wait:
+            for thread in threads:
+                if thread is not threading.current_thread():
+                    thread.join()
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.idle_timeout)
+            except Queue.Empty:
+                with self._lock:
+                    # Work submitted while timing out is picked up here,
+                    # later submits start a new thread.
+                    if not self._queue.empty():
+                        continue
+
+                    self._threads.remove(threading.current_thread())
+                    return
+
+            if item is None:
+                with self._lock:
+                    self._threads.remove(threading.current_thread())
+                return
+
+            future, func, args, kwargs = item
+
+            try:
+                future.set_result(func(*args, **kwargs))
+            except Exception:
+                future.set_exception(sys.exc_info())
+
 
 class memoize(object):
     '''
     Cache instances of a class.
+
+    Instances are keyed on the identity of the arguments (eg. the
+    connection object) and the value of plain scalar arguments. The cache
+    is bounded: the least recently used instance is evicted past `maxsize`
+    entries, and entries older than `instance_ttl` seconds are rebuilt.
+    Both can be changed on the decorated class, eg.
+    C{ltm.Pools.instance_ttl = 3600}. Other attributes set on the decorated
+    class are set on the wrapped class, eg. C{ltm.Pools.ttl = 60} sets the
+    object lifetime of L{ObjectList}.
     '''
+    maxsize = 128
+    instance_ttl = None
+    _settings = ('cls', 'maxsize', 'instance_ttl')
 
     def __init__(self, cls):
         ''' '''
         self.cls = cls
         self.__dict__.update(cls.__dict__)
-        self.cls.instances = dict()
+        self.maxsize = memoize.maxsize
+        self.instance_ttl = memoize.instance_ttl
+        self._instances = OrderedDict()
+        self._lock = threading.RLock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def __setattr__(self, attr, value):
+        if attr not in self._settings and not attr.startswith('_'):
+            setattr(self.cls, attr, value)
+
+        object.__setattr__(self, attr, value)
+
+    @staticmethod
+    def _key_part(value):
+        if isinstance(value, (basestring, int, long, float, bool,
+                              type(None))):
+            return value
+
+        return ('id', id(value))
+
+    def _key(self, args, kwargs):
+        return (tuple(self._key_part(a) for a in args),
+                tuple((k, self._key_part(v))
+                      for k, v in sorted(kwargs.items())))
 
     def __call__(self, *args, **kwargs):
         ''' '''
-        args_str = [str(s) for s in args]
-        kwargs_str = ['%s:%s' % (k, v) for k, v in sorted(kwargs.items(), key=lambda x: x[0])]
-        key = '::'.join(args_str + kwargs_str)
+        key = self._key(args, kwargs)
+        now = time.time()
+
+        with self._lock:
+            entry = self._instances.pop(key, None)
+
+            if entry is not None and self.instance_ttl is not None and \
+                    now - entry[1] > self.instance_ttl:
+                self._stats['evictions'] += 1
+                entry = None
+
+            if entry is None:
+                self._stats['misses'] += 1
+                entry = (self.cls(*args, **kwargs), now)
+            else:
+                self._stats['hits'] += 1
+
+            # Reinsert so the OrderedDict stays in least recently used order.
+            self._instances[key] = entry
+
+            while self.maxsize is not None and \
+                    len(self._instances) > self.maxsize:
+                self._instances.popitem(last=False)
+                self._stats['evictions'] += 1
+
+            return entry[0]
+
+    def cache_info(self):
+        '''
+        Get cache counters.
+
+        @return: dict with hits, misses, evictions, size and maxsize.
+        '''
+        with self._lock:
+            info = dict(self._stats)
+            info['size'] = len(self._instances)
+            info['maxsize'] = self.maxsize
+            return info
+
+    def seed(self, instance, *args, **kwargs):
+        '''
+        Store an existing instance as the one returned for the given
+        arguments, eg. a collection restored from disk.
+        '''
+        key = self._key(args, kwargs)
+
+        with self._lock:
+            self._instances.pop(key, None)
+            self._instances[key] = (instance, time.time())
+
+    def clear(self):
+        '''
+        Drop every cached instance and reset the counters.
+        '''
+        with self._lock:
+            self._instances.clear()
+            self._stats = dict.fromkeys(self._stats, 0)
+
+
+class ObjectCache(object):
+    '''
+    Cache of bigip objects keyed by name, shared by every L{ObjectList}.
+    Loads merge into the cache, and the time each object and each of its
+    lazy fields was loaded is kept so stale entries can be found.
+    '''
+    def __init__(self):
+        ''' '''
+        self._entries = dict()
+        self._lock = threading.RLock()
+
+    def __getstate__(self):
+        return {'_entries': self._entries}
+
+    def __setstate__(self, state):
+        self._entries = state['_entries']
+        self._lock = threading.RLock()
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def __getitem__(self, name):
+        return self._entries[name]['object']
+
+    def __len__(self):
+        return len(self._entries)
+
+    def names(self):
+        '''
+        @return: list of cached object names.
+        '''
+        return self._entries.keys()
+
+    def values(self):
+        '''
+        @return: list of cached objects.
+        '''
+        return [e['object'] for e in self._entries.values()]
+
+    def update(self, objects, marker=None, deep=False):
+        '''
+        Add or replace objects, keyed on their name attribute.
 
-        if key not in self.cls.instances:
-            self.cls.instances[key] = self.cls(*args, **kwargs)
+        @param objects: list of objects
+        @keyword marker: bigip config marker the objects were read under.
+        @keyword deep: the objects were loaded with their details.
+        '''
+        now = time.time()
 
-        return self.cls.instances[key]
+        with self._lock:
+            for obj in objects:
+                self._entries[obj.name] = {'object': obj,
+                                           'loaded': now,
+                                           'marker': marker,
+                                           'deep': deep,
+                                           'fields': dict()}
+
+    def is_deep(self, name):
+        '''
+        @return: True when the named object was loaded with its details.
+        '''
+        entry = self._entries.get(name)
+        return bool(entry and entry.get('deep'))
+
+    def remove(self, names):
+        '''
+        Drop objects from the cache.
+
+        @param names: list of object names
+        '''
+        with self._lock:
+            for name in names:
+                self._entries.pop(name, None)
+
+    def clear(self):
+        '''
+        Drop every object.
+        '''
+        with self._lock:
+            self._entries.clear()
+
+    def touch(self, names, field):
+        '''
+        Record that `field` was just reloaded for the named objects.
+        '''
+        now = time.time()
+
+        with self._lock:
+            for name in names:
+                if name in self._entries:
+                    self._entries[name]['fields'][field] = now
+
+    def missing(self, names, ttl=None, marker=None):
+        '''
+        Find names that are not cached, were loaded more than `ttl` seconds
+        ago, or were loaded under another config marker than `marker`.
+
+        @param names: list of object names
+        @keyword ttl: object lifetime in seconds, None for no expiry.
+        @keyword marker: current bigip config marker, None to ignore.
+        @return: list of names to load.
+        '''
+        now = time.time()
+        ret = list()
+
+        for name in names:
+            entry = self._entries.get(name)
+
+            if entry is None or \
+                    (ttl is not None and now - entry['loaded'] > ttl) or \
+                    (marker is not None and entry.get('marker') != marker):
+                ret.append(name)
+
+        return ret
+
+    def stale_fields(self, names, field_ttl):
+        '''
+        Find cached objects with fields older than their lifetime.
+
+        @param names: list of object names
+        @param field_ttl: dict mapping field attribute to lifetime in seconds
+        @return: dict mapping field attribute to list of stale objects.
+        '''
+        now = time.time()
+        ret = dict()
+
+        for name in names:
+            entry = self._entries.get(name)
+
+            if entry is None:
+                continue
+
+            for field, ttl in field_ttl.iteritems():
+                loaded = entry['fields'].get(field, entry['loaded'])
+
+                if now - loaded > ttl:
+                    ret.setdefault(field, list()).append(entry['object'])
+
+        return ret
 
 
 class ObjectList(object):
     '''
     @var klass: Class to instatiate when acessing bigip objecs in this list.
+    @var ttl: Seconds a cached object is served before it is reloaded,
+        None to cache forever.
+    @var field_ttl: dict mapping a lazy field attribute (eg. '_status') to
+        the seconds it is served before being reset.
+    @var field_loaders: dict mapping a lazy field attribute to the name of a
+        method reloading it for a list of objects in one batched call.
+        Fields without a loader are reset and fetched again on access.
+    @var page_size: Number of objects loaded per batch by L{iter_multi}.
+    @var conditional_reload: Only reload objects when the bigip config
+        marker (see L{pybigip.Connection.config_marker}) changed since they
+        were loaded.
     '''
     klass = None
+    page_size = 500
+    conditional_reload = True
+    ttl = None
+    field_ttl = dict()
+    field_loaders = dict()
     _objects = None
     _names = None
+    _marker = None
 
     def __init__(self, con):
         '''
         @param con: L{Connection} instance.
         '''
         self._con = con
-        self._objects = dict()
+        self._objects = ObjectCache()
+        self.field_ttl = dict(self.field_ttl)
     
     @property
     def names(self):
@@ -53,57 +590,236 @@ class ObjectList(object):
 
         return self._names
     
-    def get(self, name, reload=False):
+    def get(self, name, reload=False, deep=False):
         '''
         Get a Object by name.
 
         @param name: Name of object
         @keyword reload: Reload cache.
+        @keyword deep: Preload object details, see L{load}.
         @return: object.
         '''
-        return self.get_multi([name], reload)
+        return self.get_multi([name], reload, deep)
 
-    def get_all(self, reload=False):
+    def get_all(self, reload=False, deep=False):
         '''
         Get all objects configured on the bigip.
 
-        @keyword reload: Reload cache.
+        @keyword reload: Reload cache, see L{get_multi}.
+        @keyword deep: Preload object details, see L{load}.
         @return: list of objects.
         '''
-        return self.get_multi(self.names, reload)
+        marker = self._check_marker() if reload else None
+        return self._get_multi(self.names, reload, deep, marker)
 
-    def get_multi(self, names, reload=False):
+    def get_multi(self, names, reload=False, deep=False):
         '''
-        Get a set of objects
+        Get a set of objects. Objects that are not cached or past their ttl
+        are loaded in one batch and merged into the cache, stale fields of
+        the others are refreshed with L{refresh_fields}.
 
         @param names: List of objects names to get.
-        @keyword reload: Reload cache.
+        @keyword reload: Reload cache. With L{conditional_reload} only the
+            objects loaded before the last bigip config change are reloaded.
+        @keyword deep: Preload object details, see L{load}.
         @return: List of objects
         '''
-        missing = list()
-        objects = list()
+        marker = self._check_marker() if reload else None
+        return self._get_multi(names, reload, deep, marker)
 
-        if reload:
-            missing = names
+    def _get_multi(self, names, reload, deep, marker):
+        if reload and marker is None:
+            missing = list(names)
         else:
-            for name in names:
-                try:
-                    objects.append(self._objects[name])
-                except KeyError:
-                    missing.append(name)
-        
+            missing = self._objects.missing(names, self.ttl, marker)
+
+        instrument.cache(self._con, type(self).__name__,
+                         len(names) - len(missing), len(missing))
+
         if missing:
-            temp = self.load(missing)
-            objects += temp
-            self._objects = dict(((p.name, p) for p in temp))
+            if self._marker is None and self.conditional_reload:
+                # Record the marker the first objects are read under, so
+                # later reloads and restored copies can be checked.
+                self._marker = self._con.config_marker()
+
+            self._objects.update(self.load(missing, deep), self._marker,
+                                 deep)
+            self._loaded(missing)
+
+        if not reload or len(missing) < len(names):
+            self.refresh_fields(names)
+
+        return [self._objects[n] for n in names]
+
+    def _check_marker(self):
+        '''
+        Read the bigip config marker. When it changed since the last check
+        the object list is diffed, see L{diff_names}.
+
+        @return: current marker, or None when reloads are unconditional.
+        '''
+        if not self.conditional_reload:
+            return None
+
+        marker = self._con.config_marker()
+
+        if marker is not None and marker != self._marker:
+            if self._names is not None:
+                self.diff_names()
+
+            self._marker = marker
+
+        return marker
+
+    def diff_names(self):
+        '''
+        Re-read the object list from the bigip and drop cached objects that
+        no longer exist.
+
+        @return: tuple of (added, removed) name lists, compared to the last
+            object list read and the cached objects.
+        '''
+        previous = set(self._names or ()) | set(self._objects.names())
+        self._names = None
+        names = self.names
+        current = set(names)
+        removed = [n for n in previous if n not in current]
+        added = [n for n in names if n not in previous]
+
+        if removed:
+            self._objects.remove(removed)
+            self._loaded(removed)
+
+        return added, removed
+
+    def sync(self, deep=False):
+        '''
+        Bring the collection up to date with one get_list call: objects
+        added on the bigip are loaded in one batch and removed ones are
+        dropped. Objects that still exist are left alone.
+
+        @keyword deep: Preload details of added objects, see L{load}.
+        @return: dict with 'added' and 'removed' name lists.
+        '''
+        added, removed = self.diff_names()
+
+        if added:
+            self._objects.update(self.load(added, deep), self._marker, deep)
+            self._loaded(added)
+
+        return {'added': added, 'removed': removed}
+
+    def revalidate(self, deep=None):
+        '''
+        Bring a collection restored from an older copy up to date. When the
+        bigip config marker matches the one the collection was loaded at
+        nothing else is read. Otherwise the object list is L{sync}ed and
+        the cached objects are reloaded, one batch per depth.
+
+        @keyword deep: Preload object details, see L{load}. None reloads
+            every object at the depth it was loaded with, and loads added
+            objects deep when any cached object was.
+        @return: dict with 'added', 'removed' and 'reloaded' name lists.
+        '''
+        marker = self._con.config_marker()
+
+        if marker is not None and marker == self._marker:
+            return {'added': [], 'removed': [], 'reloaded': []}
+
+        names = self._objects.names()
 
-        return objects
+        if deep is None:
+            depth = dict((n, self._objects.is_deep(n)) for n in names)
+            deep = any(depth.itervalues())
+        else:
+            depth = dict.fromkeys(names, deep)
+
+        self._marker = marker
+        report = self.sync(deep)
+        removed = set(report['removed'])
+        report['reloaded'] = [n for n in names if n not in removed]
+
+        for flag in (True, False):
+            reload = [n for n in report['reloaded'] if depth[n] == flag]
+
+            if reload:
+                self._objects.update(self.load(reload, flag), marker, flag)
+                self._loaded(reload)
+
+        return report
+
+    def iter_all(self, deep=False, cache=True, page_size=None):
+        '''
+        Iterate over all objects configured on the bigip, see L{iter_multi}.
+        '''
+        return self.iter_multi(self.names, deep, cache, page_size)
+
+    def iter_multi(self, names, deep=False, cache=True, page_size=None):
+        '''
+        Iterate over a set of objects, loading them a page at a time so the
+        first objects are available before the whole set is read.
+
+        @param names: List of objects names to get.
+        @keyword deep: Preload object details, see L{load}.
+        @keyword cache: Serve and store objects in the cache. When False
+            every page is read from the bigip and dropped once consumed,
+            keeping memory flat for large exports.
+        @keyword page_size: Objects per page, defaults to L{page_size}.
+        @return: generator of objects
+        '''
+        size = page_size or self.page_size
+
+        for start in xrange(0, len(names), size):
+            page = names[start:start + size]
+
+            if cache:
+                objects = ObjectList.get_multi(self, page, False, deep)
+            else:
+                objects = self.load(page, deep)
+
+            for obj in objects:
+                yield obj
+
+    def refresh_fields(self, names):
+        '''
+        Reset fields older than their L{field_ttl} on the named objects and
+        reload them with one batched call per field where a loader exists.
+
+        @param names: List of object names.
+        '''
+        if not self.field_ttl:
+            return
+
+        stale = self._objects.stale_fields(names, self.field_ttl)
+
+        for field, objects in stale.iteritems():
+            for obj in objects:
+                setattr(obj, field, None)
+
+            if field in self.field_loaders:
+                getattr(self, self.field_loaders[field])(objects)
+
+            self._objects.touch([o.name for o in objects], field)
+
+        if stale:
+            self._loaded(list(set(o.name for objects in stale.itervalues()
+                                  for o in objects)))
+
+    def _loaded(self, names):
+        '''
+        Hook called after objects or their fields were (re)loaded into the
+        cache, used by subclasses to drop indexes built from old data.
+
+        @param names: names of the loaded objects.
+        '''
 
-    def load(self, names):
+    def load(self, names, deep=False):
         '''
         Read object from bigip.
 
         @param names: object names
+        @keyword deep: Preload object details with batched calls. Ignored
+            unless a subclass overrides this method.
         @return: list of objects
         '''
         return [self.klass(self._con, n) for n in names]
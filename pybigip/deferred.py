@@ -0,0 +1,178 @@
+'''
+Non-blocking front end for the LTM and GTM object model.
+
+Method calls and lazy properties on deferred objects run on worker threads
+and return a L{core.Future} instead of blocking. Model objects in a result
+are wrapped again, so chained lookups stay non-blocking. Pair it with a
+L{pybigip.ConnectionPool} to get one worker per session.
+
+Example:
+    >>> con = pybigip.ConnectionPool('ltm.example.company', 'admin',
+    ...                              'foobarbaz', size=8)
+    >>> pools = pybigip.deferred.Pools(con).get_all(deep=True).result()
+    >>> pools[0].members.result()[0].status().result()
+'''
+
+import sys
+import threading
+import weakref
+from pybigip import core, gtm, ltm
+
+
+MODELS = (ltm.VirtualAddress, ltm.VirtualServer, ltm.Pool, ltm.Member,
+          ltm.Node, gtm.Application, gtm.Datacenter, gtm.WideIP,
+          gtm.GTMPool, gtm.GTMPoolMember, gtm.Server)
+
+_executors = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def executor(con):
+    '''
+    Get the shared executor for a connection, sized by its `workers`. Its
+    threads exit when idle and it is shut down once the connection is
+    garbage collected.
+
+    @param con: L{pybigip.Connection} instance.
+    @return: L{core.Executor}
+    '''
+    with _lock:
+        if con not in _executors:
+            pool = core.Executor(getattr(con, 'workers', 1))
+            pool._owner = weakref.ref(
+                    con, lambda ref, pool=pool: pool.shutdown(wait=False))
+            _executors[con] = pool
+
+        return _executors[con]
+
+
+def shutdown(con=None, wait=True):
+    '''
+    Shut down the executor of a connection, see L{core.Executor.shutdown}.
+    Later deferred calls start a new one.
+
+    @keyword con: L{pybigip.Connection} instance, None for every connection.
+    @keyword wait: block until the worker threads exited.
+    '''
+    with _lock:
+        if con is None:
+            pools = _executors.values()
+            _executors.clear()
+        else:
+            pools = [_executors.pop(con)] if con in _executors else []
+
+    for pool in pools:
+        pool.shutdown(wait)
+
+
+def wrap(obj, con):
+    '''
+    Wrap model objects (and lists of them) in L{Deferred}.
+
+    @param obj: value to wrap
+    @param con: connection the value was read from
+    @return: wrapped value, anything else is returned as is.
+    '''
+    if isinstance(obj, list):
+        return [wrap(o, con) for o in obj]
+
+    if isinstance(obj, dict):
+        return dict((k, wrap(v, con)) for k, v in obj.iteritems())
+
+    if isinstance(obj, MODELS):
+        return Deferred(obj, con)
+
+    return obj
+
+
+class Deferred(object):
+    '''
+    Proxy running every method call and property read of the wrapped object
+    on the connection executor. Plain instance attributes, eg. `name`, are
+    returned directly.
+    '''
+    def __init__(self, obj, con):
+        '''
+        @param obj: object to wrap
+        @param con: L{pybigip.Connection} instance.
+        '''
+        self._obj = obj
+        self._con = con
+
+    def __repr__(self):
+        return '<Deferred %r>' % self._obj
+
+    def __getattr__(self, attr):
+        member = getattr(type(self._obj), attr, None)
+
+        if isinstance(member, property):
+            return self._submit(getattr, self._obj, attr)
+
+        if callable(member):
+            method = getattr(self._obj, attr)
+            return lambda *args, **kwargs: self._submit(method, *args,
+                                                        **kwargs)
+
+        return wrap(getattr(self._obj, attr), self._con)
+
+    def _submit(self, func, *args, **kwargs):
+        future = core.Future()
+        call = executor(self._con).submit(func, *args, **kwargs)
+
+        def done(call):
+            try:
+                future.set_result(wrap(call.result(), self._con))
+            except Exception:
+                future.set_exception(sys.exc_info())
+
+        call.add_done_callback(done)
+        return future
+
+
+def Pools(con):
+    '''
+    @return: deferred L{ltm.Pools} for `con`.
+    '''
+    return Deferred(ltm.Pools(con), con)
+
+
+def VirtualServers(con):
+    '''
+    @return: deferred L{ltm.VirtualServers} for `con`.
+    '''
+    return Deferred(ltm.VirtualServers(con), con)
+
+
+def Nodes(con):
+    '''
+    @return: deferred L{ltm.Nodes} for `con`.
+    '''
+    return Deferred(ltm.Nodes(con), con)
+
+
+def Applications(con):
+    '''
+    @return: deferred L{gtm.Applications} for `con`.
+    '''
+    return Deferred(gtm.Applications(con), con)
+
+
+def WideIPs(con):
+    '''
+    @return: deferred L{gtm.WideIPs} for `con`.
+    '''
+    return Deferred(gtm.WideIPs(con), con)
+
+
+def GTMPools(con):
+    '''
+    @return: deferred L{gtm.GTMPools} for `con`.
+    '''
+    return Deferred(gtm.GTMPools(con), con)
+
+
+def Servers(con):
+    '''
+    @return: deferred L{gtm.Servers} for `con`.
+    '''
+    return Deferred(gtm.Servers(con), con)
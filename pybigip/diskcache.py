@@ -0,0 +1,136 @@
+'''
+Persistent on-disk cache of the LTM object model.
+
+Collections are pickled into an SQLite file per bigip hostname, together
+with the bigip config marker they were loaded at. A new process restores
+them and reattaches them to a live connection. When the config marker
+changed since they were saved the objects added on the bigip are loaded
+and the others reloaded at the depth they were saved with, otherwise the
+restored copies are used as is. Member status is runtime state and is never
+restored, deep lookups read it again in one batch.
+
+Example (warm start):
+    >>> con = pybigip.Connection('ltm.example.company', 'admin', 'foobarbaz')
+    >>> cache = pybigip.diskcache.DiskCache('/var/cache/pybigip.db')
+    >>> pools, vips, nodes = cache.warm(con)
+    >>> ...
+    >>> cache.save(con, pools, vips, nodes)
+'''
+
+import cPickle as pickle
+import sqlite3
+import threading
+import time
+from pybigip import core, ltm
+
+
+COLLECTIONS = (ltm.Pools, ltm.VirtualServers, ltm.Nodes)
+
+
+class DiskCache(object):
+    '''
+    SQLite backed store of pickled L{core.ObjectList} collections.
+    '''
+    def __init__(self, path):
+        '''
+        @param path: SQLite database file, created if missing.
+        '''
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+
+        with self._db:
+            self._db.execute('CREATE TABLE IF NOT EXISTS collections ('
+                             'host TEXT, kind TEXT, saved REAL, data BLOB, '
+                             'PRIMARY KEY (host, kind))')
+
+    def close(self):
+        ''' '''
+        self._db.close()
+
+    def save(self, con, *collections):
+        '''
+        Store collections, replacing earlier copies for the same bigip.
+
+        @param con: L{pybigip.Connection} the collections were read from.
+        @param collections: L{core.ObjectList} instances
+        '''
+        now = time.time()
+        rows = [(con._hostname, type(c).__name__, now,
+                 sqlite3.Binary(pickle.dumps(c.__getstate__(),
+                                             pickle.HIGHEST_PROTOCOL)))
+                for c in collections]
+
+        with self._lock:
+            with self._db:
+                self._db.executemany('INSERT OR REPLACE INTO collections '
+                                     'VALUES (?, ?, ?, ?)', rows)
+
+    def saved(self, con, kind):
+        '''
+        @param con: L{pybigip.Connection} instance.
+        @param kind: collection class, eg. L{ltm.Pools}
+        @return: time the collection was saved, or None.
+        '''
+        row = self._row(con, kind, 'saved')
+        return row[0] if row else None
+
+    def load(self, con, kind):
+        '''
+        Restore a collection and reattach it to `con`. Memoized collections
+        are also registered, so eg. ltm.Pools(con) returns the restored
+        instance.
+
+        @param con: L{pybigip.Connection} instance.
+        @param kind: collection class, eg. L{ltm.Pools}
+        @return: collection, or None when nothing was saved.
+        '''
+        row = self._row(con, kind, 'data')
+
+        if row is None:
+            return None
+
+        cls = getattr(kind, 'cls', kind)
+        collection = cls.__new__(cls)
+
+        with core.attach(con):
+            collection.__setstate__(pickle.loads(str(row[0])))
+
+        if isinstance(kind, core.memoize):
+            kind.seed(collection, con)
+
+        return collection
+
+    def warm(self, con, kinds=COLLECTIONS, revalidate=True):
+        '''
+        Restore collections, falling back to empty ones for anything not
+        saved yet.
+
+        @param con: L{pybigip.Connection} instance.
+        @keyword kinds: collection classes to restore.
+        @keyword revalidate: L{core.ObjectList.revalidate} restored
+            collections: when the bigip config changed since the save load
+            the objects added, drop the ones removed and reload the others.
+        @return: list of collections, in the order of `kinds`.
+        '''
+        ret = list()
+
+        for kind in kinds:
+            collection = self.load(con, kind)
+
+            if collection is None:
+                collection = kind(con)
+            elif revalidate:
+                collection.revalidate()
+
+            ret.append(collection)
+
+        return ret
+
+    def _row(self, con, kind, column):
+        cls = getattr(kind, 'cls', kind)
+
+        with self._lock:
+            return self._db.execute(
+                    'SELECT %s FROM collections WHERE host = ? AND kind = ?'
+                    % column, (con._hostname, cls.__name__)).fetchone()
@@ -0,0 +1,258 @@
+'''
+Drain nodes out of every pool they belong to.
+
+Example (Rolling deploy, two nodes at a time):
+    >>> drainer = pybigip.drain.Drainer(con, timeout=300)
+    >>> for node, remaining in drainer.rolling(nodes, deploy, concurrency=2):
+    ...     print node.name, remaining
+'''
+
+import time
+from pybigip import batch, core, ltm
+
+
+CURRENT_CONNECTIONS = 'STATISTIC_SERVER_SIDE_CURRENT_CONNECTIONS'
+
+
+class Drainer(object):
+    '''
+    Disable, wait for and re-enable the pool memberships of nodes with
+    batched calls.
+    '''
+    def __init__(self, con, interval=1.0, max_interval=30.0, timeout=600.0,
+                 monitor=False):
+        '''
+        @param con: L{pybigip.Connection} instance.
+        @keyword interval: first delay in seconds between connection polls,
+            doubled after every poll.
+        @keyword max_interval: longest delay between polls.
+        @keyword timeout: seconds to wait for connections to drain.
+        @keyword monitor: also force the members down with their monitor
+            state, not only stop new sessions.
+        '''
+        self._con = con
+        self.interval = interval
+        self.max_interval = max_interval
+        self.timeout = timeout
+        self.monitor = monitor
+        self._disabled = set()
+
+    def memberships(self, nodes):
+        '''
+        Find the pool members of nodes, from the shared L{ltm.Pools} address
+        index.
+
+        @param nodes: list of L{ltm.Node} objects
+        @return: list of L{ltm.Member} objects
+        '''
+        pools = ltm.Pools(self._con)
+        return [m for n in nodes for m in pools.members_by_address(n.address)]
+
+    def set_enabled(self, members, enabled, monitored=None):
+        '''
+        Enable or disable members with one array call per iControl method.
+
+        @param members: list of L{ltm.Member} objects
+        @param enabled: bool
+        @keyword monitored: members whose monitor state is set too, defaults
+            to `members` when the drainer uses monitor states.
+        '''
+        if monitored is None:
+            monitored = members if self.monitor else ()
+
+        writes = batch.WriteBatch(self._con)
+
+        for member in members:
+            writes.set_member_enabled(member, enabled)
+
+        for member in monitored:
+            writes.set_member_monitor_state(member, enabled)
+
+        writes.commit()
+
+    def _member_call(self, method, members, unwrap=None):
+        '''
+        Call a LocalLB.Pool get_member_* method for members of many pools in
+        one chunked call.
+
+        @keyword unwrap: callable extracting the list of member results from
+            a per pool result, for methods returning structures.
+        @return: list of per member results, in the order of `members`.
+        '''
+        names = list()
+        groups = dict()
+
+        for i, member in enumerate(members):
+            if member.pool.name not in groups:
+                names.append(member.pool.name)
+                groups[member.pool.name] = list()
+
+            groups[member.pool.name].append(i)
+
+        dicts = [[members[i].to_dict() for i in groups[n]] for n in names]
+        values = self._con.call_chunked(
+                getattr(self._con.LocalLB.Pool, method), names, dicts,
+                weights=[len(d) for d in dicts])
+        ret = [None] * len(members)
+
+        for name, pool_values in zip(names, values):
+            if unwrap is not None:
+                pool_values = unwrap(pool_values)
+
+            for i, value in zip(groups[name], pool_values):
+                ret[i] = value
+
+        return ret
+
+    def connections(self, members):
+        '''
+        Read current server side connections of members in one chunked
+        get_member_statistics call.
+
+        @param members: list of L{ltm.Member} objects
+        @return: list of connection counts, in the order of `members`.
+        '''
+        if not members:
+            return []
+
+        stats = self._member_call('get_member_statistics', members,
+                                  lambda s: s['statistics'])
+        return [ltm.decode_statistics(s['statistics']).get(
+                    CURRENT_CONNECTIONS, 0) for s in stats]
+
+    def disable(self, members):
+        '''
+        Disable the members that are enabled, reading their session and
+        monitor states first so L{restore} leaves members that were already
+        disabled alone.
+
+        @param members: list of L{ltm.Member} objects
+        @return: (sessions, monitored) lists of the members disabled.
+        '''
+        if not members:
+            return [], []
+
+        states = self._member_call('get_member_session_enabled_state',
+                                   members)
+        sessions = [m for m, s in zip(members, states)
+                    if s == batch.STATE_ENABLED]
+        monitored = list()
+
+        if self.monitor:
+            states = self._member_call('get_member_monitor_state', members)
+            monitored = [m for m, s in zip(members, states)
+                         if s == batch.STATE_ENABLED]
+
+        self.set_enabled(sessions, False, monitored)
+
+        for member in sessions:
+            self._disabled.add(('session',) + self._key(member))
+
+        for member in monitored:
+            self._disabled.add(('monitor',) + self._key(member))
+
+        return sessions, monitored
+
+    def restore(self, members):
+        '''
+        Re-enable the states of members that L{disable} turned off.
+
+        @param members: list of L{ltm.Member} objects
+        '''
+        sessions = [m for m in members
+                    if ('session',) + self._key(m) in self._disabled]
+        monitored = [m for m in members
+                     if ('monitor',) + self._key(m) in self._disabled]
+        self.set_enabled(sessions, True, monitored)
+
+        for member in members:
+            self._disabled.discard(('session',) + self._key(member))
+            self._disabled.discard(('monitor',) + self._key(member))
+
+    @staticmethod
+    def _key(member):
+        return (member.pool.name, member.address, member.port)
+
+    def wait(self, members, timeout=None):
+        '''
+        Poll member connections with exponential backoff until all reach
+        zero or the timeout expires.
+
+        @param members: list of L{ltm.Member} objects
+        @keyword timeout: seconds, defaults to the drainer timeout.
+        @return: dict mapping members still holding connections to their
+            connection count, empty when drained.
+        '''
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.time() + timeout
+        delay = self.interval
+        pending = list(members)
+
+        while True:
+            counts = self.connections(pending) if pending else []
+            remaining = dict((m, c) for m, c in zip(pending, counts) if c > 0)
+            pending = [m for m in pending if m in remaining]
+
+            if not pending or time.time() + delay > deadline:
+                return remaining
+
+            time.sleep(delay)
+            delay = min(delay * 2, self.max_interval)
+
+    def drain(self, nodes, timeout=None):
+        '''
+        Disable every enabled pool membership of nodes and wait for their
+        connections to drain.
+
+        @param nodes: list of L{ltm.Node} objects
+        @return: dict of members still holding connections, see L{wait}.
+        '''
+        members = self.memberships(nodes)
+        self.disable(members)
+        return self.wait(members, timeout)
+
+    def enable(self, nodes):
+        '''
+        Re-enable the pool memberships of nodes that L{drain} disabled.
+
+        @param nodes: list of L{ltm.Node} objects
+        '''
+        self.restore(self.memberships(nodes))
+
+    def rolling(self, nodes, action=None, concurrency=1, timeout=None,
+                force=False):
+        '''
+        Drain nodes `concurrency` at a time: disable the wave, wait for it
+        to drain, run `action(node)` on every drained node of the wave in
+        parallel, then restore it before moving on. Members that were
+        disabled before the wave stay disabled.
+
+        @param nodes: list of L{ltm.Node} objects
+        @keyword action: callable run on each drained node, eg. a deploy
+        @keyword concurrency: nodes drained at once
+        @keyword timeout: seconds to wait for each wave to drain
+        @keyword force: also run `action` on nodes whose members still held
+            connections when the timeout expired.
+        @return: generator of (node, remaining) tuples, remaining maps
+            members that did not drain in time to their connection count.
+        '''
+        for start in xrange(0, len(nodes), concurrency):
+            wave = nodes[start:start + concurrency]
+            members = self.memberships(wave)
+            self.disable(members)
+
+            try:
+                remaining = self.wait(members, timeout)
+                left = dict((node, dict((m, c)
+                                        for m, c in remaining.iteritems()
+                                        if m.ip == node.address))
+                            for node in wave)
+                ready = [n for n in wave if force or not left[n]]
+
+                if action is not None and ready:
+                    core.parallel_map(action, ready, concurrency)
+            finally:
+                self.restore(members)
+
+            for node in wave:
+                yield node, left[node]
@@ -0,0 +1,303 @@
+'''
+Prometheus exporter for pool and member state.
+
+A background thread refreshes an in-memory snapshot with batched and
+incremental calls (config marker checked reloads, one chunked pool status
+call, member status refreshes limited to entries older than
+`status_max_age`, chunked statistics), scrapes are answered from the last
+snapshot and never reach the bigip. The default `status_max_age` of 0
+re-reads every member status each cycle.
+
+Usage:
+    $ PYBIGIP_PASSWORD=secret pybigip-exporter ltm.example.company admin \\
+          --listen-port 9142 --interval 30
+'''
+
+import BaseHTTPServer
+import logging
+import optparse
+import os
+import threading
+import time
+import pybigip
+from pybigip import ltm
+
+
+log = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def escape(value):
+    '''
+    Escape a label value for the text exposition format.
+    '''
+    return unicode(value).replace('\\', '\\\\').replace('"', '\\"') \
+                         .replace('\n', '\\n')
+
+
+class Metrics(object):
+    '''
+    Text exposition format builder.
+    '''
+    def __init__(self):
+        ''' '''
+        self._families = list()
+        self._samples = dict()
+
+    def add(self, name, type, help, labels, value):
+        '''
+        Add a sample, declaring its family on first use.
+
+        @param name: metric name
+        @param type: 'gauge' or 'counter'
+        @param help: help text
+        @param labels: list of (label, value) tuples
+        @param value: sample value, None samples are skipped.
+        '''
+        if value is None:
+            return
+
+        if name not in self._samples:
+            self._families.append((name, type, help))
+            self._samples[name] = list()
+
+        label_str = ','.join('%s="%s"' % (k, escape(v)) for k, v in labels)
+        self._samples[name].append('%s{%s} %s' % (name, label_str, value)
+                                   if label_str else '%s %s' % (name, value))
+
+    def render(self):
+        '''
+        @return: exposition text
+        '''
+        lines = list()
+
+        for name, type, help in self._families:
+            lines.append('# HELP %s %s' % (name, help))
+            lines.append('# TYPE %s %s' % (name, type))
+            lines.extend(self._samples[name])
+
+        return '\n'.join(lines) + '\n'
+
+
+class Exporter(object):
+    '''
+    Keep a rendered metrics snapshot of one bigip up to date.
+    '''
+    def __init__(self, con, interval=30, stats=True, status_max_age=0):
+        '''
+        @param con: L{pybigip.Connection} instance.
+        @keyword interval: seconds between refreshes.
+        @keyword stats: also export traffic counters.
+        @keyword status_max_age: only re-read member statuses older than
+            this many seconds, 0 re-reads all of them on every refresh.
+        '''
+        self._con = con
+        self.interval = interval
+        self.stats = stats
+        self.status_max_age = status_max_age
+        self.errors = 0
+        self.last_refresh = None
+        self.last_duration = None
+        self._text = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh(self):
+        '''
+        Read the bigip and replace the snapshot.
+        '''
+        start = time.time()
+        pools = ltm.Pools(self._con)
+        # Reload pools only when the config marker changed, keeping the
+        # member status of the others for status_max_age.
+        pools.revalidate()
+        all_pools = pools.get_all()
+        pools.load_all_status(all_pools)
+        pools.refresh(('status',), max_age=self.status_max_age,
+                      pools=all_pools)
+        pools.refresh(('priority',), pools=all_pools)
+        table = pools.collect_stats() if self.stats else None
+
+        metrics = Metrics()
+        self._add_pools(metrics, all_pools)
+        self._add_members(metrics, all_pools)
+
+        if table is not None:
+            self._add_stats(metrics, table)
+
+        self.last_duration = time.time() - start
+        self.last_refresh = time.time()
+        self._text = metrics.render()
+
+    def _add_pools(self, metrics, pools):
+        for pool in pools:
+            labels = [('pool', pool.name)]
+            status = pool._status
+            metrics.add('bigip_pool_available', 'gauge',
+                        'Pool availability is green.', labels,
+                        int(status['availability_status'] ==
+                            'AVAILABILITY_STATUS_GREEN'))
+            metrics.add('bigip_pool_enabled', 'gauge', 'Pool is enabled.',
+                        labels, int(status['enabled_status'] ==
+                                    'ENABLED_STATUS_ENABLED'))
+
+    def _add_members(self, metrics, pools):
+        for pool in pools:
+            for member in pool.members:
+                labels = [('pool', pool.name), ('address', member.address),
+                          ('port', member.port)]
+                status = member._status
+
+                if status is not None:
+                    metrics.add('bigip_pool_member_available', 'gauge',
+                                'Member availability is green.', labels,
+                                int(status['availability_status'] ==
+                                    'AVAILABILITY_STATUS_GREEN'))
+                    metrics.add('bigip_pool_member_enabled', 'gauge',
+                                'Member is enabled.', labels,
+                                int(status['enabled_status'] ==
+                                    'ENABLED_STATUS_ENABLED'))
+
+                metrics.add('bigip_pool_member_priority', 'gauge',
+                            'Member priority group.', labels,
+                            member._priority)
+
+    def _add_stats(self, metrics, table):
+        for i, (pool, address, port) in enumerate(table.keys()):
+            if address is None:
+                prefix = 'bigip_pool_'
+                labels = [('pool', pool)]
+            else:
+                prefix = 'bigip_pool_member_'
+                labels = [('pool', pool), ('address', address),
+                          ('port', port)]
+
+            for name, type, scale in ltm.STAT_COUNTERS:
+                metrics.add(prefix + name + '_total', 'counter',
+                            'Server side %s.' % name.replace('_', ' '),
+                            labels, table.values[name][i])
+
+            for name, type in ltm.STAT_GAUGES:
+                metrics.add(prefix + name, 'gauge',
+                            'Server side %s.' % name.replace('_', ' '),
+                            labels, table.values[name][i])
+
+    def render(self):
+        '''
+        Get the last snapshot with exporter health metrics. Never calls the
+        bigip.
+
+        @return: exposition text
+        '''
+        metrics = Metrics()
+        metrics.add('bigip_exporter_refresh_errors_total', 'counter',
+                    'Failed snapshot refreshes.', [], self.errors)
+        metrics.add('bigip_exporter_last_refresh_timestamp_seconds', 'gauge',
+                    'Time of the last successful refresh.', [],
+                    self.last_refresh)
+        metrics.add('bigip_exporter_refresh_duration_seconds', 'gauge',
+                    'Duration of the last successful refresh.', [],
+                    self.last_duration)
+        return (self._text or '') + metrics.render()
+
+    def run(self):
+        '''
+        Refresh every `interval` seconds until L{stop} is called.
+        '''
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception:
+                self.errors += 1
+                log.exception('refresh of %s failed', self._con)
+
+            self._stop.wait(self.interval)
+
+    def start(self):
+        '''
+        Run the refresh loop on a daemon thread.
+        '''
+        self._thread = threading.Thread(target=self.run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        ''' '''
+        self._stop.set()
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    '''
+    Serve the exporter snapshot on /metrics.
+    '''
+    exporter = None
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+
+        body = self.exporter.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        log.debug(format, *args)
+
+
+def serve(exporter, address='', port=9142):
+    '''
+    Start the refresh loop and serve scrapes forever.
+    '''
+    class handler(Handler):
+        pass
+
+    handler.exporter = exporter
+    server = BaseHTTPServer.HTTPServer((address, port), handler)
+    exporter.start()
+    server.serve_forever()
+
+
+def main(argv=None):
+    '''
+    Command line entry point.
+    '''
+    parser = optparse.OptionParser(
+            usage='%prog [options] hostname username',
+            description='Export bigip pool and member metrics to '
+                        'Prometheus. The password is read from the '
+                        'PYBIGIP_PASSWORD environment variable.')
+    parser.add_option('--listen-address', default='')
+    parser.add_option('--listen-port', type='int', default=9142)
+    parser.add_option('--interval', type='float', default=30,
+                      help='seconds between refreshes [%default]')
+    parser.add_option('--chunk-size', type='int', default=500,
+                      help='items per iControl call [%default]')
+    parser.add_option('--sessions', type='int', default=2,
+                      help='concurrent bigip sessions [%default]')
+    parser.add_option('--status-max-age', type='float', default=0,
+                      help='only re-read member statuses older than this '
+                           'many seconds [%default]')
+    parser.add_option('--no-stats', action='store_true',
+                      help='skip traffic counters')
+    options, args = parser.parse_args(argv)
+
+    if len(args) != 2:
+        parser.error('hostname and username are required')
+
+    logging.basicConfig(level=logging.INFO)
+    con = pybigip.ConnectionPool(args[0], args[1],
+                                 os.environ.get('PYBIGIP_PASSWORD', ''),
+                                 size=options.sessions,
+                                 chunk_size=options.chunk_size)
+    exporter = Exporter(con, options.interval, not options.no_stats,
+                        options.status_max_age)
+    serve(exporter, options.listen_address, options.listen_port)
+
+
+if __name__ == '__main__':
+    main()
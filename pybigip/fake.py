@@ -0,0 +1,513 @@
+'''
+In-process stand-in for a bigip, for development and benchmarking without
+a lab device.
+
+L{FakeBigIP} is a L{pybigip.Connection} that answers the iControl methods
+used by pybigip from a synthetic config held in memory, counts round trips
+and can inject per call and per item latency.
+
+Example:
+    >>> con = pybigip.fake.FakeBigIP(pools=1000, members=4, latency=0.05)
+    >>> pools = pybigip.ltm.Pools(con).get_all(deep=True)
+    >>> con.round_trips
+    4
+'''
+
+import collections
+import threading
+import time
+from bigsuds import MethodNotFound
+from pybigip import Connection, instrument
+
+
+GREEN = 'AVAILABILITY_STATUS_GREEN'
+RED = 'AVAILABILITY_STATUS_RED'
+ENABLED = 'ENABLED_STATUS_ENABLED'
+DISABLED = 'ENABLED_STATUS_DISABLED'
+
+
+def uint64(value):
+    '''
+    Encode an int as an iControl ULong64 dict.
+    '''
+    return {'high': value >> 32, 'low': value & 0xffffffff}
+
+
+def object_status(available=True, enabled=True):
+    '''
+    Build an iControl ObjectStatus dict.
+    '''
+    return {'availability_status': GREEN if available else RED,
+            'enabled_status': ENABLED if enabled else DISABLED,
+            'status_description': ''}
+
+
+class FakeInterface(object):
+    '''
+    iControl interface of a L{FakeBigIP}, eg. con.LocalLB.Pool.
+    '''
+    def __init__(self, bigip, name):
+        self._bigip = bigip
+        self._name = name
+
+    def __getattr__(self, method):
+        if method.startswith('__'):
+            raise AttributeError(method)
+
+        handler = getattr(self._bigip, '%s__%s' % (
+                self._name.replace('.', '_'), method), None)
+
+        if handler is None:
+            raise MethodNotFound('%s.%s' % (self._name, method))
+
+        def call(*args):
+            return self._bigip._call(self._name, method, handler, args)
+
+        return instrument.wrap(self._bigip, self._name, method, call)
+
+
+class FakeNamespace(object):
+    '''
+    iControl namespace of a L{FakeBigIP}, eg. con.LocalLB.
+    '''
+    def __init__(self, bigip, name):
+        self._bigip = bigip
+        self._name = name
+
+    def __getattr__(self, attr):
+        if attr.startswith('__'):
+            raise AttributeError(attr)
+
+        interface = FakeInterface(self._bigip, '%s.%s' % (self._name, attr))
+        setattr(self, attr, interface)
+        return interface
+
+
+class FakeBigIP(Connection):
+    '''
+    Synthetic bigip with `pools` pools of `members` members each, spread
+    over shared nodes, one virtual server per pool and an optional GTM
+    config.
+
+    @ivar calls: Counter of round trips per (interface, method).
+    @ivar items: number of array items sent, a proxy for payload size.
+    @ivar marker: config marker, bumped by every write.
+    '''
+    def __init__(self, pools=100, members=4, nodes=None, vips=None, apps=0,
+                 datacenters=4, wideips=0, latency=0.0, item_latency=0.0,
+                 **kwargs):
+        '''
+        Accepts the keyword arguments of L{Connection} plus:
+
+        @keyword pools: number of LTM pools
+        @keyword members: members per pool
+        @keyword nodes: number of nodes, defaults to one per four members
+            so most nodes are shared by several pools.
+        @keyword vips: number of virtual servers, defaults to `pools`.
+        @keyword apps: number of GTM applications
+        @keyword datacenters: datacenters per application
+        @keyword wideips: number of GTM wide ips, each with two GTM pools.
+        @keyword latency: seconds added to every call
+        @keyword item_latency: seconds added per array item of a call
+        '''
+        super(FakeBigIP, self).__init__('fake.bigip', **kwargs)
+        self.latency = latency
+        self.item_latency = item_latency
+        self.calls = collections.Counter()
+        self.items = 0
+        self.marker = '1'
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self._generate_ltm(pools, members, nodes, vips)
+        self._generate_gtm(apps, datacenters, wideips)
+
+    def __getattr__(self, attr):
+        if attr.startswith('__'):
+            raise AttributeError(attr)
+
+        namespace = FakeNamespace(self, attr)
+        setattr(self, attr, namespace)
+        return namespace
+
+    def __str__(self):
+        return 'FakeBigIP(%d pools)' % len(self.pools)
+
+    def with_session_id(self, session_id=None):
+        '''
+        Sessions are not modeled, calls share the fake state and hooks.
+        '''
+        return self
+
+    @property
+    def round_trips(self):
+        '''
+        @return: total number of iControl calls made.
+        '''
+        return sum(self.calls.itervalues())
+
+    def reset_counters(self):
+        '''
+        Zero L{calls} and L{items}.
+        '''
+        with self._lock:
+            self.calls.clear()
+            self.items = 0
+
+    def _call(self, interface, method, handler, args):
+        items = len(args[0]) if args and isinstance(args[0], list) else 0
+
+        with self._lock:
+            self.calls[(interface, method)] += 1
+            self.items += items
+
+        delay = self.latency + self.item_latency * items
+
+        if delay:
+            time.sleep(delay)
+
+        with self._lock:
+            return handler(*args)
+
+    def _changed(self):
+        self.marker = str(int(self.marker) + 1)
+
+    def _generate_ltm(self, pools, members, nodes, vips):
+        if nodes is None:
+            nodes = max(members, pools * members // 4, 1)
+
+        if vips is None:
+            vips = pools
+
+        self.nodes = collections.OrderedDict(
+                ('/Common/node%d' % i,
+                 '10.%d.%d.%d' % (i >> 16 & 255, i >> 8 & 255, i & 255))
+                for i in xrange(nodes))
+        node_names = list(self.nodes)
+        self.pools = collections.OrderedDict()
+        self.members = dict()
+
+        for i in xrange(pools):
+            name = '/Common/pool%d' % i
+            self.pools[name] = list()
+
+            for j in xrange(members):
+                self._add_member(name, {
+                    'address': node_names[(i * members + j) % nodes],
+                    'port': 80 + j // nodes})
+
+        self.addresses = collections.OrderedDict()
+        self.vips = collections.OrderedDict()
+        pool_names = list(self.pools) or ['']
+
+        for i in xrange(vips):
+            address = '/Common/192.168.%d.%d' % (i >> 8 & 255, i & 255)
+            self.addresses[address] = address[8:]
+            self.vips['/Common/vs%d' % i] = {
+                'pool': pool_names[i % len(pool_names)],
+                'destination': {'address': address, 'port': 443}}
+
+    def _add_member(self, pool, member):
+        self.pools[pool].append(member)
+        self.members[(pool, member['address'], member['port'])] = {
+            'priority': 0, 'enabled': True, 'available': True}
+
+    def _generate_gtm(self, apps, datacenters, wideips):
+        dcs = ['/Common/dc%d' % i for i in xrange(datacenters)]
+        self.servers = collections.OrderedDict(
+                ('/Common/server%d' % i, dc) for i, dc in enumerate(dcs))
+        self.gtm_pools = collections.OrderedDict()
+        self.wideips = collections.OrderedDict()
+
+        for i in xrange(wideips):
+            names = ['/Common/gpool%d_%d' % (i, k) for k in xrange(2)]
+
+            for k, name in enumerate(names):
+                self.gtm_pools[name] = [
+                        {'name': '/Common/vs%d' % i, 'server': server}
+                        for server in self.servers]
+
+            self.wideips['/Common/wip%d.example.com' % i] = [
+                    {'pool_name': n, 'order': k, 'ratio': 1}
+                    for k, n in enumerate(names)]
+
+        self.apps = collections.OrderedDict()
+        self.contexts = dict()
+        wip_names = list(self.wideips)
+
+        for i in xrange(apps):
+            name = '/Common/app%d' % i
+            self.apps[name] = {
+                'datacenters': list(dcs),
+                'description': 'application %d' % i,
+                'wideips': wip_names[i:i + 1]}
+
+            for dc in dcs:
+                self.contexts[(name, dc)] = True
+
+    def _counter(self, seed):
+        return uint64(int((time.time() - self._started) * 1000) * seed)
+
+    def _statistics(self, seed):
+        return [
+            {'type': 'STATISTIC_SERVER_SIDE_BYTES_IN',
+             'value': self._counter(seed * 1500), 'time_stamp': 0},
+            {'type': 'STATISTIC_SERVER_SIDE_BYTES_OUT',
+             'value': self._counter(seed * 9000), 'time_stamp': 0},
+            {'type': 'STATISTIC_SERVER_SIDE_PACKETS_IN',
+             'value': self._counter(seed), 'time_stamp': 0},
+            {'type': 'STATISTIC_SERVER_SIDE_PACKETS_OUT',
+             'value': self._counter(seed * 6), 'time_stamp': 0},
+            {'type': 'STATISTIC_SERVER_SIDE_TOTAL_CONNECTIONS',
+             'value': self._counter(1), 'time_stamp': 0},
+            {'type': 'STATISTIC_SERVER_SIDE_CURRENT_CONNECTIONS',
+             'value': uint64(0), 'time_stamp': 0},
+        ]
+
+    def _member_state(self, pool, member):
+        return self.members[(pool, member['address'], member['port'])]
+
+    # Management
+
+    def Management_DBVariable__query(self, variables):
+        return [{'name': v, 'value': self.marker} for v in variables]
+
+    # System
+
+    def System_Session__get_session_identifier(self):
+        return 1
+
+    def System_Session__start_transaction(self):
+        pass
+
+    def System_Session__submit_transaction(self):
+        pass
+
+    def System_Session__rollback_transaction(self):
+        pass
+
+    # LocalLB.Pool
+
+    def LocalLB_Pool__get_list(self):
+        return list(self.pools)
+
+    def LocalLB_Pool__get_member_v2(self, pools):
+        return [[dict(m) for m in self.pools[p]] for p in pools]
+
+    def LocalLB_Pool__get_lb_method(self, pools):
+        return ['LB_METHOD_ROUND_ROBIN' for p in pools]
+
+    def LocalLB_Pool__get_object_status(self, pools):
+        return [object_status() for p in pools]
+
+    def LocalLB_Pool__get_member_address(self, pools, members):
+        return [[self.nodes[m['address']] for m in ms] for ms in members]
+
+    def LocalLB_Pool__get_member_object_status(self, pools, members):
+        ret = list()
+
+        for pool, ms in zip(pools, members):
+            states = [self._member_state(pool, m) for m in ms]
+            ret.append([object_status(s['available'], s['enabled'])
+                        for s in states])
+
+        return ret
+
+    def LocalLB_Pool__get_member_priority(self, pools, members):
+        return [[self._member_state(p, m)['priority'] for m in ms]
+                for p, ms in zip(pools, members)]
+
+    def LocalLB_Pool__get_member_session_enabled_state(self, pools, members):
+        return [['STATE_ENABLED' if self._member_state(p, m)['enabled']
+                 else 'STATE_DISABLED' for m in ms]
+                for p, ms in zip(pools, members)]
+
+    def LocalLB_Pool__get_member_monitor_state(self, pools, members):
+        return [['STATE_ENABLED' if self._member_state(p, m)['available']
+                 else 'STATE_DISABLED' for m in ms]
+                for p, ms in zip(pools, members)]
+
+    def LocalLB_Pool__get_member_metadata(self, pools, members):
+        return [[[] for m in ms] for ms in members]
+
+    def LocalLB_Pool__get_statistics(self, pools):
+        return {'statistics': [{'pool_name': p,
+                                'statistics': self._statistics(
+                                    len(self.pools[p]))}
+                               for p in pools],
+                'time_stamp': 0}
+
+    def LocalLB_Pool__get_member_statistics(self, pools, members):
+        return [{'statistics': [{'member': dict(m),
+                                 'statistics': self._statistics(1)}
+                                for m in ms],
+                 'time_stamp': 0} for ms in members]
+
+    def LocalLB_Pool__get_all_member_statistics(self, pools):
+        return self.LocalLB_Pool__get_member_statistics(
+                pools, [self.pools[p] for p in pools])
+
+    def LocalLB_Pool__create_v2(self, pools, methods, members):
+        for pool, ms in zip(pools, members):
+            self.pools[pool] = list()
+
+            for member in ms:
+                self._add_member(pool, dict(member))
+
+        self._changed()
+
+    def LocalLB_Pool__delete_pool(self, pools):
+        for pool in pools:
+            for member in self.pools.pop(pool):
+                del self.members[(pool, member['address'], member['port'])]
+
+        self._changed()
+
+    def LocalLB_Pool__add_member_v2(self, pools, members):
+        for pool, ms in zip(pools, members):
+            for member in ms:
+                self._add_member(pool, dict(member))
+
+        self._changed()
+
+    def LocalLB_Pool__remove_member_v2(self, pools, members):
+        for pool, ms in zip(pools, members):
+            keys = set((m['address'], m['port']) for m in ms)
+            self.pools[pool] = [m for m in self.pools[pool]
+                                if (m['address'], m['port']) not in keys]
+
+            for address, port in keys:
+                self.members.pop((pool, address, port), None)
+
+        self._changed()
+
+    def LocalLB_Pool__set_member_priority(self, pools, members, priorities):
+        for pool, ms, values in zip(pools, members, priorities):
+            for member, value in zip(ms, values):
+                self._member_state(pool, member)['priority'] = value
+
+        self._changed()
+
+    def LocalLB_Pool__set_member_session_enabled_state(self, pools, members,
+                                                      states):
+        for pool, ms, values in zip(pools, members, states):
+            for member, value in zip(ms, values):
+                self._member_state(pool, member)['enabled'] = \
+                        value == 'STATE_ENABLED'
+
+        self._changed()
+
+    def LocalLB_Pool__set_member_monitor_state(self, pools, members, states):
+        for pool, ms, values in zip(pools, members, states):
+            for member, value in zip(ms, values):
+                self._member_state(pool, member)['available'] = \
+                        value == 'STATE_ENABLED'
+
+        self._changed()
+
+    # LocalLB.NodeAddressV2
+
+    def LocalLB_NodeAddressV2__get_list(self):
+        return list(self.nodes)
+
+    def LocalLB_NodeAddressV2__get_address(self, nodes):
+        return [self.nodes[n] for n in nodes]
+
+    # LocalLB.VirtualServer
+
+    def LocalLB_VirtualServer__get_list(self):
+        return list(self.vips)
+
+    def LocalLB_VirtualServer__get_destination_v2(self, vips):
+        return [dict(self.vips[v]['destination']) for v in vips]
+
+    def LocalLB_VirtualServer__get_default_pool_name(self, vips):
+        return [self.vips[v]['pool'] for v in vips]
+
+    def LocalLB_VirtualServer__set_default_pool_name(self, vips, pools):
+        for vip, pool in zip(vips, pools):
+            self.vips[vip]['pool'] = pool
+
+        self._changed()
+
+    # LocalLB.VirtualAddressV2
+
+    def LocalLB_VirtualAddressV2__get_list(self):
+        return list(self.addresses)
+
+    def LocalLB_VirtualAddressV2__get_address(self, addresses):
+        return [self.addresses[a] for a in addresses]
+
+    # GlobalLB.Application
+
+    def GlobalLB_Application__get_list(self):
+        return list(self.apps)
+
+    def GlobalLB_Application__get_data_centers(self, apps):
+        return [list(self.apps[a]['datacenters']) for a in apps]
+
+    def GlobalLB_Application__get_description(self, apps):
+        return [self.apps[a]['description'] for a in apps]
+
+    def GlobalLB_Application__get_wide_ips(self, apps):
+        return [list(self.apps[a]['wideips']) for a in apps]
+
+    def GlobalLB_Application__get_object_status(self, apps):
+        return [object_status() for a in apps]
+
+    def GlobalLB_Application__get_application_context_status(self, contexts):
+        return [object_status(enabled=self.contexts[
+                    (c['application_name'], c['object_name'])])
+                for c in contexts]
+
+    def GlobalLB_Application__enable_application_context_object(self,
+                                                                contexts):
+        for c in contexts:
+            self.contexts[(c['application_name'], c['object_name'])] = True
+
+        self._changed()
+
+    def GlobalLB_Application__disable_application_context_object(self,
+                                                                 contexts):
+        for c in contexts:
+            self.contexts[(c['application_name'], c['object_name'])] = False
+
+        self._changed()
+
+    # GlobalLB.WideIP
+
+    def GlobalLB_WideIP__get_list(self):
+        return list(self.wideips)
+
+    def GlobalLB_WideIP__get_wideip_pool(self, wideips):
+        return [[dict(p) for p in self.wideips[w]] for w in wideips]
+
+    def GlobalLB_WideIP__get_object_status(self, wideips):
+        return [object_status() for w in wideips]
+
+    # GlobalLB.Pool
+
+    def GlobalLB_Pool__get_list(self):
+        return list(self.gtm_pools)
+
+    def GlobalLB_Pool__get_member_v2(self, pools):
+        return [[dict(m) for m in self.gtm_pools[p]] for p in pools]
+
+    def GlobalLB_Pool__get_object_status(self, pools):
+        return [object_status() for p in pools]
+
+    def GlobalLB_Pool__get_member_object_status(self, pools, members):
+        return [[object_status() for m in ms] for ms in members]
+
+    def GlobalLB_Pool__get_member_ratio(self, pools, members):
+        return [[1 for m in ms] for ms in members]
+
+    # GlobalLB.Server
+
+    def GlobalLB_Server__get_list(self):
+        return list(self.servers)
+
+    def GlobalLB_Server__get_data_center(self, servers):
+        return [self.servers[s] for s in servers]
+
+    def GlobalLB_Server__get_object_status(self, servers):
+        return [object_status() for s in servers]
@@ -0,0 +1,155 @@
+'''
+Query many bigips in parallel.
+
+Example (Which devices have member 10.1.2.3 down?):
+    >>> with pybigip.fleet.Fleet([pybigip.Connection(h, 'admin', 'pw')
+    ...                           for h in hosts], timeout=30) as fleet:
+    ...     for con, members, error in fleet.members('10.1.2.3'):
+    ...         down = [m for m in members or () if not m.available]
+'''
+
+import Queue
+import time
+from pybigip import core, gtm, ltm
+
+
+class Fleet(object):
+    '''
+    Fan out calls to a set of bigip connections. Worker threads exit when
+    idle, L{close} (or leaving a with block) stops them right away.
+    '''
+    def __init__(self, connections, timeout=None, workers=None):
+        '''
+        @param connections: list of L{pybigip.Connection} instances.
+        @keyword timeout: default seconds to wait for each device.
+        @keyword workers: maximum devices queried at once, defaults to one
+            per connection.
+        '''
+        self.connections = list(connections)
+        self.timeout = timeout
+        self._executor = core.Executor(workers or len(self.connections))
+        self._busy = dict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        '''
+        Shut down the worker threads. Calls to hung devices are left to
+        finish in the background.
+        '''
+        self._executor.shutdown(wait=False)
+
+    def map(self, func, timeout=None):
+        '''
+        Call `func(con)` for every connection concurrently and yield the
+        results as each device finishes. Devices still running when the
+        timeout expires are reported with a L{core.Timeout} error, their
+        calls are left to finish in the background. Until they do, later
+        calls skip the device and report the same error, so hung devices
+        hold at most one worker thread.
+
+        @param func: callable taking a connection
+        @keyword timeout: seconds to wait, defaults to the fleet timeout.
+        @return: generator of (connection, result, exception) tuples, result
+            is None when the call failed.
+        '''
+        if timeout is None:
+            timeout = self.timeout
+
+        done = Queue.Queue()
+        pending = dict()
+
+        busy = list()
+
+        for con in self.connections:
+            previous = self._busy.get(id(con))
+
+            if previous is not None and not previous.done():
+                busy.append(con)
+                continue
+
+            future = self._executor.submit(func, con)
+            self._busy[id(con)] = future
+            pending[id(future)] = con
+            future.add_done_callback(done.put)
+
+        for con in busy:
+            yield con, None, core.Timeout(
+                    '%s is still busy with an earlier call' % con)
+
+        deadline = None if timeout is None else time.time() + timeout
+
+        while pending:
+            try:
+                if deadline is None:
+                    future = done.get()
+                else:
+                    future = done.get(timeout=max(deadline - time.time(), 0))
+            except Queue.Empty:
+                break
+
+            con = pending.pop(id(future), None)
+
+            if con is None:
+                continue
+
+            error = future.exception()
+
+            if error is None:
+                yield con, future.result(), None
+            else:
+                yield con, None, error
+
+        for con in pending.itervalues():
+            yield con, None, core.Timeout(
+                    '%s did not answer in %s seconds' % (con, timeout))
+
+    def pools(self, deep=True, timeout=None):
+        '''
+        L{ltm.Pools.get_all} on every device.
+        '''
+        return self.map(
+                lambda con: ltm.Pools(con).get_all(nocache=True, deep=deep),
+                timeout)
+
+    def members(self, address, timeout=None):
+        '''
+        L{ltm.Pools.members_by_address} on every device, with the status of
+        the matching members freshly read. Pools changed on a device since
+        the last sweep are reloaded, which rebuilds its address index.
+        '''
+        def find(con):
+            pools = ltm.Pools(con)
+            pools.get_all(nocache=True)
+            members = pools.members_by_address(address)
+            pools.refresh(('status',), max_age=0,
+                          pools=list(set(m.pool for m in members)))
+            return members
+
+        return self.map(find, timeout)
+
+    def nodes(self, timeout=None):
+        '''
+        L{ltm.Nodes.get_all} on every device.
+        '''
+        return self.map(lambda con: ltm.Nodes(con).get_all(nocache=True),
+                        timeout)
+
+    def virtual_servers(self, deep=False, timeout=None):
+        '''
+        L{ltm.VirtualServers.get_all} on every device.
+        '''
+        return self.map(
+                lambda con: ltm.VirtualServers(con).get_all(True, deep),
+                timeout)
+
+    def applications(self, timeout=None):
+        '''
+        L{gtm.Applications.get_all} on every device.
+        '''
+        return self.map(lambda con: gtm.Applications(con).get_all(True),
+                        timeout)
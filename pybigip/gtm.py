@@ -5,10 +5,15 @@ Example (Disable datacenter for a distributed application):
     >>> con = pybigip.Connection('gtm.example.company', 'admin', 'foobarbaz')
     >>> myapp = pybigip.gtm.Application(con, '/Common/myapp')
     >>> myapp.datacenters['/Common/SFO'].enabled = False
+
+Example (Find the virtual servers behind every wide ip):
+    >>> for wip in pybigip.gtm.WideIPs(con).get_all(deep=True):
+    ...     print wip.name, [m.name for m in wip.virtual_servers]
 '''
 
 import itertools
-from pybigip import core
+from copy import copy
+from pybigip import batch, core
 
 
 class Applications(core.ObjectList):
@@ -21,14 +26,17 @@ class Applications(core.ObjectList):
         super(Applications, self).__init__(con)
         self._lcon = self._con.GlobalLB.Application
 
-    def load(self, names):
+    def load(self, names, deep=False):
         '''
         Override parent load method to preload Application datacenter status
         data.
+
+        @keyword deep: Also preload wide ips, application status and the
+            status of every datacenter context.
         '''
         ret = list()
-        app_dcs = self._lcon.get_data_centers(names)
-        app_desc = self._lcon.get_description(names)
+        app_dcs = self._con.call_chunked(self._lcon.get_data_centers, names)
+        app_desc = self._con.call_chunked(self._lcon.get_description, names)
 
         for app, dcs, desc in itertools.izip(names, app_dcs, app_desc):
             app_obj = Application(self._con, app)
@@ -36,14 +44,81 @@ class Applications(core.ObjectList):
             app_obj._description = desc
             ret.append(app_obj)
 
+        if deep:
+            app_wips = self._con.call_chunked(self._lcon.get_wide_ips, names)
+            app_status = self._con.call_chunked(self._lcon.get_object_status,
+                                                names)
+
+            for app_obj, wips, status in itertools.izip(ret, app_wips,
+                                                        app_status):
+                app_obj._wips = wips
+                app_obj._status = status
+
+            self.datacenter_status(ret)
+
+        return ret
+
+    def datacenter_status(self, apps=None):
+        '''
+        Get the context status of every datacenter of many applications with
+        chunked get_application_context_status calls, and cache it in the
+        L{Datacenter} objects.
+
+        @keyword apps: list of L{Application} objects, defaults to all
+            applications.
+        @return: dict mapping application names to dicts mapping datacenter
+            names to context status dicts.
+        '''
+        if apps is None:
+            apps = self.get_all()
+
+        dcs = [dc for app in apps for dc in app.datacenters.values()]
+        statuses = self._con.call_chunked(
+                self._lcon.get_application_context_status,
+                [dc.context() for dc in dcs]) or []
+        ret = dict((app.name, dict()) for app in apps)
+
+        for dc, status in itertools.izip(dcs, statuses):
+            dc._status = status
+            ret[dc._app.name][dc.name] = status
+
         return ret
 
+    def set_datacenter_enabled(self, dc, enabled, apps=None):
+        '''
+        Enable or disable a datacenter in many applications with chunked
+        enable/disable_application_context_object calls.
+
+        Example (Evacuate a datacenter):
+            >>> gtm.Applications(con).set_datacenter_enabled('/Common/SFO',
+            ...                                             False)
+
+        @param dc: datacenter name
+        @param enabled: True to enable, False to disable.
+        @keyword apps: list of L{Application} objects, defaults to all
+            applications. Applications without the datacenter are skipped.
+        @return: list of the changed L{Datacenter} objects.
+        '''
+        if apps is None:
+            apps = self.get_all()
+
+        changed = [app.datacenters[dc] for app in apps
+                   if dc in app.datacenters]
+        writes = batch.WriteBatch(self._con)
+
+        for datacenter in changed:
+            writes.set_datacenter_enabled(datacenter, enabled)
+
+        writes.commit()
+        return changed
+
 
 class Application(object):
     '''
     A Distributed Application.
     '''
     _description = None
+    _status = None
     _wips = None
 
     def __init__(self, con, name, dcs=None):
@@ -54,19 +129,29 @@ class Application(object):
         self.name = name
         self._dcs = dcs
 
-    def get_ctx(self, name, type):
+    def context(self, name, type):
         '''
-        Get application object context status.
+        Build an application object context.
 
         @param name: Object name
         @param type: Object type
-        @return: dict containing object context status information.
+        @return: iControl ApplicationObjectContext dict.
         '''
-        ctx = {
+        return {
             'application_name': self.name,
             'object_name': name,
             'object_type': type
         }
+
+    def get_ctx(self, name, type):
+        '''
+        Get application object context status.
+
+        @param name: Object name
+        @param type: Object type
+        @return: dict containing object context status information.
+        '''
+        ctx = self.context(name, type)
         return self._lcon.get_application_context_status([ctx])[0]
 
     def enable_ctx(self, name, type):
@@ -76,11 +161,7 @@ class Application(object):
         @param name: Object name
         @param type: Object type
         '''
-        ctx = {
-            'application_name': self.name,
-            'object_name': name,
-            'object_type': type
-        }
+        ctx = self.context(name, type)
         self._lcon.enable_application_context_object([ctx])
 
     def disable_ctx(self, name, type):
@@ -90,11 +171,7 @@ class Application(object):
         @param name: Object name
         @param type: Object type
         '''
-        ctx = {
-            'application_name': self.name,
-            'object_name': name,
-            'object_type': type
-        }
+        ctx = self.context(name, type)
         self._lcon.disable_application_context_object([ctx])
 
     @property
@@ -104,7 +181,7 @@ class Application(object):
 
         @return: application description from the bigip.
         '''
-        if not self._description:
+        if self._description is None:
             self._description = self._lcon.get_description([self.name])[0]
 
         return self._description
@@ -116,26 +193,39 @@ class Application(object):
 
         @return: List of L{Datacenter} objects for this application.
         '''
-        if not self._dcs:
+        if self._dcs is None:
             dcs = self._lcon.get_data_centers([self.name])[0]
             self._dcs = dict(((dc, Datacenter(self, dc)) for dc in dcs))
 
         return self._dcs
 
-    def status(self):
+    def status(self, nocache=False):
         '''
+        Get application object status.
+
+        @keyword nocache: Reload the cached status.
         '''
-        return self._lcon.get_object_status([self.name])[0]
+        if self._status is None or nocache:
+            self._status = self._lcon.get_object_status([self.name])[0]
+
+        return self._status
 
     @property
     def wips(self):
         '''
         '''
-        if not self._wips:
+        if self._wips is None:
             self._wips = self._lcon.get_wide_ips([self.name])[0]
 
         return self._wips
 
+    @property
+    def wideips(self):
+        '''
+        @return: list of L{WideIP} objects of this application.
+        '''
+        return WideIPs(self._con).get_multi(self.wips)
+
 
 class Datacenter(object):
     '''
@@ -151,21 +241,39 @@ class Datacenter(object):
         self._app = app
         self.name = name
 
+    def context(self):
+        '''
+        @return: iControl ApplicationObjectContext dict of this datacenter.
+        '''
+        return self._app.context(self.name,
+                                 'APPLICATION_OBJECT_TYPE_DATACENTER')
+
     def enable(self):
         '''
         Enable this datacenter by enabling the coresponding application
         context object in the Application.
         '''
-        self._app.enable_ctx(self.name,
-                             'APPLICATION_OBJECT_TYPE_DATACENTER')
+        writes = batch.WriteBatch(self._app._con)
+        writes.set_datacenter_enabled(self, True)
+        writes.commit()
 
     def disable(self):
         '''
         Disable this datacenter by disabling the coresponding application
         context object in the Application.
         '''
-        self._app.disable_ctx(self.name,
-                              'APPLICATION_OBJECT_TYPE_DATACENTER')
+        writes = batch.WriteBatch(self._app._con)
+        writes.set_datacenter_enabled(self, False)
+        writes.commit()
+
+    def _state_changed(self, enabled):
+        '''
+        Update the cached status after the datacenter was enabled or
+        disabled on the bigip.
+        '''
+        if self._status is not None:
+            self._status['enabled_status'] = 'ENABLED_STATUS_ENABLED' \
+                    if enabled else 'ENABLED_STATUS_DISABLED'
 
     def toggle(self):
         '''
@@ -173,16 +281,22 @@ class Datacenter(object):
         '''
         self.enabled = not self.enabled
 
-    def status(self):
+    def status(self, nocache=False):
         '''
         Get status information for this datacenter.
+
+        @keyword nocache: Reload the cached status.
         '''
-        return self._app.get_ctx(self.name,
-                                 'APPLICATION_OBJECT_TYPE_DATACENTER')
+        if self._status is None or nocache:
+            self._status = self._app.get_ctx(
+                    self.name, 'APPLICATION_OBJECT_TYPE_DATACENTER')
+
+        return self._status
 
     @property
     def enabled(self):
         '''
+        Cached enabled status, kept current by L{enable} and L{disable}.
 
         @return: bool representation of datacenter enabled status.
         '''
@@ -201,3 +315,565 @@ class Datacenter(object):
             self.enable()
         else:
             self.disable()
+
+
+class WideIP(object):
+    '''
+    GTM wide ip.
+    '''
+    _pools = None
+    _status = None
+
+    def __getstate__(self):
+        state = copy(self.__dict__)
+        state['_con'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._con = core.attached_connection()
+
+    def __init__(self, con, name):
+        '''
+        @param con: L{pybigip.Connection} instance.
+        @param name: wide ip name
+        '''
+        self._con = con
+        self.name = name
+
+    @property
+    def _lcon(self):
+        return self._con.GlobalLB.WideIP
+
+    @property
+    def pool_entries(self):
+        '''
+        Lazy load the wide ip pool list.
+
+        @return: list of iControl WideIPPool dicts (pool_name, order, ratio).
+        '''
+        if self._pools is None:
+            self._pools = self._lcon.get_wideip_pool([self.name])[0]
+
+        return self._pools
+
+    @property
+    def ratios(self):
+        '''
+        @return: dict mapping pool names to their ratio in this wide ip.
+        '''
+        return dict((p['pool_name'], p['ratio']) for p in self.pool_entries)
+
+    @property
+    def pools(self):
+        '''
+        @return: list of L{GTMPool} objects in wide ip order.
+        '''
+        entries = sorted(self.pool_entries, key=lambda p: p['order'])
+        return GTMPools(self._con).get_multi(
+                [p['pool_name'] for p in entries])
+
+    @property
+    def virtual_servers(self):
+        '''
+        @return: list of L{GTMPoolMember} objects of all pools.
+        '''
+        return [m for pool in self.pools for m in pool.members]
+
+    def status(self, nocache=False):
+        '''
+        Get wide ip object status.
+
+        @keyword nocache: Reload the cached status.
+        '''
+        if self._status is None or nocache:
+            self._status = self._lcon.get_object_status([self.name])[0]
+
+        return self._status
+
+
+@core.memoize
+class WideIPs(core.ObjectList):
+    '''
+    Access GTM wide ips.
+    '''
+    klass = WideIP
+    field_loaders = {'_pools': 'load_all_pools',
+                     '_status': 'load_all_status'}
+    _by_pool = None
+
+    def __getstate__(self):
+        state = copy(self.__dict__)
+        state['_con'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._con = core.attached_connection()
+
+    @property
+    def _lcon(self):
+        return self._con.GlobalLB.WideIP
+
+    def load(self, names, deep=False):
+        '''
+        Read wide ips from the bigip.
+
+        @param names: wide ip names
+        @keyword deep: Preload pool lists and status of every wide ip, and
+            load the referenced pools deep, see L{GTMPools.load}.
+        @return: list of L{WideIP} objects
+        '''
+        wips = [WideIP(self._con, n) for n in names]
+
+        if deep:
+            self.load_all_pools(wips)
+            self.load_all_status(wips)
+            pools = set(p['pool_name'] for w in wips for p in w._pools)
+            GTMPools(self._con).get_multi(sorted(pools), deep=True)
+
+        return wips
+
+    def load_all_pools(self, wips):
+        '''
+        Load the pool list of all wide ips in `wips` with chunked
+        get_wideip_pool calls.
+        '''
+        missing = [w for w in wips if w._pools is None]
+
+        if not missing:
+            return
+
+        pools = self._con.call_chunked(self._lcon.get_wideip_pool,
+                                       [w.name for w in missing])
+
+        for wip, wip_pools in itertools.izip(missing, pools):
+            wip._pools = wip_pools
+
+    def load_all_status(self, wips):
+        '''
+        Load the object status of all wide ips in `wips` with chunked
+        get_object_status calls.
+        '''
+        missing = [w for w in wips if w._status is None]
+
+        if not missing:
+            return
+
+        statuses = self._con.call_chunked(self._lcon.get_object_status,
+                                          [w.name for w in missing])
+
+        for wip, status in itertools.izip(missing, statuses):
+            wip._status = status
+
+    def _pool_index(self):
+        '''
+        Lazy build the reverse index from pool name to wide ips.
+        '''
+        if self._by_pool is None:
+            wips = self.get_all()
+            self.load_all_pools(wips)
+            index = dict()
+
+            for wip in wips:
+                for entry in wip._pools:
+                    index.setdefault(entry['pool_name'], list()).append(wip)
+
+            self._by_pool = index
+
+        return self._by_pool
+
+    def _loaded(self, names):
+        self._by_pool = None
+
+    def wideips_by_pool(self, name):
+        '''
+        @param name: GTM pool name
+        @return: list of L{WideIP} objects using the pool.
+        '''
+        return list(self._pool_index().get(name, ()))
+
+
+class GTMPoolMember(object):
+    '''
+    GTM pool member, a virtual server of a GTM server.
+    '''
+    __slots__ = ('pool', 'name', 'server', '_status', '_ratio')
+
+    def __init__(self, pool, name, server):
+        '''
+        @param pool: containing L{GTMPool}
+        @param name: virtual server name
+        @param server: GTM server name
+        '''
+        self.pool = pool
+        self.name = name
+        self.server = server
+        self._status = None
+        self._ratio = None
+
+    def __getstate__(self):
+        return dict((s, getattr(self, s)) for s in self.__slots__)
+
+    def __setstate__(self, state):
+        for key, value in state.iteritems():
+            setattr(self, key, value)
+
+    def to_dict(self):
+        '''
+        @return: iControl VirtualServerID dict.
+        '''
+        return {'name': self.name, 'server': self.server}
+
+    def status(self, nocache=False):
+        '''
+        Get member object status.
+
+        @keyword nocache: Reload the cached status.
+        '''
+        if self._status is None or nocache:
+            self._status = self.pool._lcon.get_member_object_status(
+                    [self.pool.name], [[self.to_dict()]])[0][0]
+
+        return self._status
+
+    @property
+    def ratio(self):
+        '''
+        Lazy load member ratio.
+        '''
+        if self._ratio is None:
+            self._ratio = self.pool._lcon.get_member_ratio(
+                    [self.pool.name], [[self.to_dict()]])[0][0]
+
+        return self._ratio
+
+
+class GTMPool(object):
+    '''
+    GTM pool.
+    '''
+    _members = None
+    _status = None
+
+    def __getstate__(self):
+        state = copy(self.__dict__)
+        state['_con'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._con = core.attached_connection()
+
+    def __init__(self, con, name):
+        '''
+        @param con: L{pybigip.Connection} instance.
+        @param name: GTM pool name
+        '''
+        self._con = con
+        self.name = name
+
+    @property
+    def _lcon(self):
+        return self._con.GlobalLB.Pool
+
+    def _set_members(self, members):
+        self._members = [GTMPoolMember(self, m['name'], m['server'])
+                         for m in members]
+
+    @property
+    def members(self):
+        '''
+        Lazy load pool members.
+
+        @return: list of L{GTMPoolMember} objects.
+        '''
+        if self._members is None:
+            self._set_members(self._lcon.get_member_v2([self.name])[0])
+
+        return self._members
+
+    def status(self, nocache=False):
+        '''
+        Get pool object status.
+
+        @keyword nocache: Reload the cached status.
+        '''
+        if self._status is None or nocache:
+            self._status = self._lcon.get_object_status([self.name])[0]
+
+        return self._status
+
+    @property
+    def wideips(self):
+        '''
+        @return: list of L{WideIP} objects using this pool.
+        '''
+        return WideIPs(self._con).wideips_by_pool(self.name)
+
+
+@core.memoize
+class GTMPools(core.ObjectList):
+    '''
+    Access GTM pools.
+    '''
+    klass = GTMPool
+    field_loaders = {'_members': 'load_all_members',
+                     '_status': 'load_all_status'}
+    _by_server = None
+
+    def __getstate__(self):
+        state = copy(self.__dict__)
+        state['_con'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._con = core.attached_connection()
+
+    @property
+    def _lcon(self):
+        return self._con.GlobalLB.Pool
+
+    def load(self, names, deep=False):
+        '''
+        Read GTM pools from the bigip.
+
+        @param names: pool names
+        @keyword deep: Preload members, pool status, member status and
+            member ratios with chunked array calls.
+        @return: list of L{GTMPool} objects
+        '''
+        pools = [GTMPool(self._con, n) for n in names]
+
+        if deep:
+            self.load_all_members(pools)
+            self.load_all_status(pools)
+            self.load_all_member_status(pools)
+            self.load_all_member_ratios(pools)
+
+        return pools
+
+    def load_all_members(self, pools):
+        '''
+        Load the members of all pools in `pools` with chunked get_member_v2
+        calls.
+        '''
+        missing = [p for p in pools if p._members is None]
+
+        if not missing:
+            return
+
+        members = self._con.call_chunked(self._lcon.get_member_v2,
+                                         [p.name for p in missing])
+
+        for pool, pool_members in itertools.izip(missing, members):
+            pool._set_members(pool_members)
+
+        self._by_server = None
+
+    def load_all_status(self, pools):
+        '''
+        Load the object status of all pools in `pools` with chunked
+        get_object_status calls.
+        '''
+        missing = [p for p in pools if p._status is None]
+
+        if not missing:
+            return
+
+        statuses = self._con.call_chunked(self._lcon.get_object_status,
+                                          [p.name for p in missing])
+
+        for pool, status in itertools.izip(missing, statuses):
+            pool._status = status
+
+    def _load_member_field(self, pools, attr, method):
+        self.load_all_members(pools)
+        load = [(p, [m for m in p._members if getattr(m, attr) is None])
+                for p in pools]
+        load = [(p, ms) for p, ms in load if ms]
+
+        if not load:
+            return
+
+        values = self._con.call_chunked(
+                getattr(self._lcon, method), [p.name for p, ms in load],
+                [[m.to_dict() for m in ms] for p, ms in load],
+                weights=[len(ms) for p, ms in load])
+
+        for (pool, members), pool_values in itertools.izip(load, values):
+            for member, value in itertools.izip(members, pool_values):
+                setattr(member, attr, value)
+
+    def load_all_member_status(self, pools):
+        '''
+        Load the status of every member of the pools in `pools` with
+        chunked get_member_object_status calls.
+        '''
+        self._load_member_field(pools, '_status', 'get_member_object_status')
+
+    def load_all_member_ratios(self, pools):
+        '''
+        Load the ratio of every member of the pools in `pools` with chunked
+        get_member_ratio calls.
+        '''
+        self._load_member_field(pools, '_ratio', 'get_member_ratio')
+
+    def _server_index(self):
+        '''
+        Lazy build the reverse index from GTM server name to pool members.
+        '''
+        if self._by_server is None:
+            pools = self.get_all()
+            self.load_all_members(pools)
+            index = dict()
+
+            for pool in pools:
+                for member in pool._members:
+                    index.setdefault(member.server, list()).append(member)
+
+            self._by_server = index
+
+        return self._by_server
+
+    def _loaded(self, names):
+        self._by_server = None
+
+    def members_by_server(self, name):
+        '''
+        @param name: GTM server name
+        @return: list of L{GTMPoolMember} objects on the server.
+        '''
+        return list(self._server_index().get(name, ()))
+
+
+class Server(object):
+    '''
+    GTM server.
+    '''
+    _datacenter = None
+    _status = None
+
+    def __getstate__(self):
+        state = copy(self.__dict__)
+        state['_con'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._con = core.attached_connection()
+
+    def __init__(self, con, name):
+        '''
+        @param con: L{pybigip.Connection} instance.
+        @param name: GTM server name
+        '''
+        self._con = con
+        self.name = name
+
+    @property
+    def _lcon(self):
+        return self._con.GlobalLB.Server
+
+    @property
+    def datacenter(self):
+        '''
+        Lazy load the datacenter name of this server.
+        '''
+        if self._datacenter is None:
+            self._datacenter = self._lcon.get_data_center([self.name])[0]
+
+        return self._datacenter
+
+    def status(self, nocache=False):
+        '''
+        Get server object status.
+
+        @keyword nocache: Reload the cached status.
+        '''
+        if self._status is None or nocache:
+            self._status = self._lcon.get_object_status([self.name])[0]
+
+        return self._status
+
+    @property
+    def virtual_servers(self):
+        '''
+        @return: list of L{GTMPoolMember} objects on this server.
+        '''
+        return GTMPools(self._con).members_by_server(self.name)
+
+
+@core.memoize
+class Servers(core.ObjectList):
+    '''
+    Access GTM servers.
+    '''
+    klass = Server
+    field_loaders = {'_datacenter': 'load_all_datacenters',
+                     '_status': 'load_all_status'}
+
+    def __getstate__(self):
+        state = copy(self.__dict__)
+        state['_con'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._con = core.attached_connection()
+
+    @property
+    def _lcon(self):
+        return self._con.GlobalLB.Server
+
+    def load(self, names, deep=False):
+        '''
+        Read GTM servers from the bigip.
+
+        @param names: server names
+        @keyword deep: Preload datacenter and status of every server.
+        @return: list of L{Server} objects
+        '''
+        servers = [Server(self._con, n) for n in names]
+
+        if deep:
+            self.load_all_datacenters(servers)
+            self.load_all_status(servers)
+
+        return servers
+
+    def _load_field(self, servers, attr, method):
+        missing = [s for s in servers if getattr(s, attr) is None]
+
+        if not missing:
+            return
+
+        values = self._con.call_chunked(getattr(self._lcon, method),
+                                        [s.name for s in missing])
+
+        for server, value in itertools.izip(missing, values):
+            setattr(server, attr, value)
+
+    def load_all_datacenters(self, servers):
+        '''
+        Load the datacenter of all servers in `servers` with chunked
+        get_data_center calls.
+        '''
+        self._load_field(servers, '_datacenter', 'get_data_center')
+
+    def load_all_status(self, servers):
+        '''
+        Load the object status of all servers in `servers` with chunked
+        get_object_status calls.
+        '''
+        self._load_field(servers, '_status', 'get_object_status')
+
+    def servers_by_datacenter(self, name):
+        '''
+        @param name: datacenter name
+        @return: list of L{Server} objects in the datacenter.
+        '''
+        servers = self.get_all()
+        self.load_all_datacenters(servers)
+        return [s for s in servers if s._datacenter == name]
@@ -0,0 +1,356 @@
+'''
+Instrumentation of iControl calls and object cache lookups.
+
+Every iControl method called through a L{pybigip.Connection} is timed and
+reported as a L{Call} to the hooks in the connection's `hooks` list, object
+lists report cache hits and misses of each get_multi. Hooks are objects
+implementing the L{Hook} interface.
+
+Example (Log every call):
+    >>> con = pybigip.Connection('ltm.example.company', 'admin', 'foobarbaz',
+    ...                          hooks=[pybigip.instrument.LoggingHook()])
+
+Example (Measure the cost of a block):
+    >>> with con.measure() as cost:
+    ...     pybigip.ltm.Pools(con).get_all(deep=True)
+    >>> print cost.round_trips, cost.seconds
+'''
+
+import bisect
+import logging
+import threading
+import time
+
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Call(object):
+    '''
+    One iControl method call.
+
+    @ivar interface: iControl interface, eg. 'LocalLB.Pool'
+    @ivar method: method name, eg. 'get_member_v2'
+    @ivar items: number of items sent, the members of nested arrays for
+        per member methods.
+    @ivar size: approximate request payload size in bytes, None unless a
+        hook asked for it, see L{Hook.payload}.
+    @ivar seconds: call latency
+    @ivar error: exception raised by the call, or None.
+    '''
+    __slots__ = ('interface', 'method', 'items', 'size', 'seconds', 'error')
+
+    def __init__(self, interface, method, items, size, seconds, error=None):
+        self.interface = interface
+        self.method = method
+        self.items = items
+        self.size = size
+        self.seconds = seconds
+        self.error = error
+
+    def __repr__(self):
+        return '<Call %s.%s items=%d size=%s %.3fs>' % (
+                self.interface, self.method, self.items, self.size,
+                self.seconds)
+
+
+def count_items(args):
+    '''
+    Count the items of a call: the entries of the first nested array
+    argument, eg. the members of get_member_*(pools, members[][]), or else
+    the length of the first array argument.
+
+    @return: item count, 0 for calls without array arguments.
+    '''
+    for arg in args[1:]:
+        if isinstance(arg, (list, tuple)) and arg and \
+                isinstance(arg[0], (list, tuple)):
+            return sum(len(a) for a in arg)
+
+    if args and isinstance(args[0], (list, tuple)):
+        return len(args[0])
+
+    return 0
+
+
+def payload_size(args):
+    '''
+    Approximate the size of the arguments as sent to the bigip. This walks
+    the whole payload, so it is only computed for hooks setting
+    L{Hook.payload}.
+    '''
+    return len(repr(args)) if args else 0
+
+
+def wrap(owner, interface, method, func):
+    '''
+    Wrap an iControl method to report every call to the hooks of `owner`.
+
+    @param owner: object with a `hooks` list, usually a L{Connection}.
+    @param interface: iControl interface name
+    @param method: method name
+    @param func: callable doing the call
+    @return: wrapped callable
+    '''
+    def call(*args, **kwargs):
+        hooks = owner.hooks
+
+        if not hooks:
+            return func(*args, **kwargs)
+
+        error = None
+        start = time.time()
+
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            size = payload_size(args) if any(h.payload for h in hooks) \
+                   else None
+            record = Call(interface, method, count_items(args), size,
+                          time.time() - start, error)
+
+            for hook in hooks:
+                hook.call(record)
+
+    call.__name__ = method
+    return call
+
+
+def cache(owner, collection, hits, misses):
+    '''
+    Report object cache hits and misses of one lookup to the hooks of
+    `owner`.
+
+    @param owner: object with a `hooks` list, usually a L{Connection}.
+    @param collection: name of the object list, eg. 'Pools'
+    @param hits: objects served from the cache
+    @param misses: objects loaded from the bigip
+    '''
+    for hook in getattr(owner, 'hooks', ()):
+        hook.cache(collection, hits, misses)
+
+
+class Interface(object):
+    '''
+    Proxy of an iControl interface reporting method calls.
+    '''
+    def __init__(self, owner, name, interface):
+        self._owner = owner
+        self._name = name
+        self._interface = interface
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            return getattr(self._interface, attr)
+
+        method = wrap(self._owner, self._name, attr,
+                      getattr(self._interface, attr))
+        setattr(self, attr, method)
+        return method
+
+    def __str__(self):
+        return str(self._interface)
+
+
+class Namespace(object):
+    '''
+    Proxy of an iControl namespace (LocalLB, GlobalLB, ...).
+    '''
+    def __init__(self, owner, name, namespace):
+        self._owner = owner
+        self._name = name
+        self._namespace = namespace
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+
+        iface = Interface(self._owner, '%s.%s' % (self._name, attr),
+                          getattr(self._namespace, attr))
+        setattr(self, attr, iface)
+        return iface
+
+
+class Proxy(object):
+    '''
+    Proxy of a bigsuds connection, eg. a session from with_session_id,
+    reporting calls to the hooks of `owner`.
+    '''
+    def __init__(self, owner, con):
+        self._owner = owner
+        self._con = con
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+
+        ns = Namespace(self._owner, attr, getattr(self._con, attr))
+        setattr(self, attr, ns)
+        return ns
+
+
+class Hook(object):
+    '''
+    Instrumentation hook interface, subclasses override what they need.
+
+    @cvar payload: compute L{Call.size} for this hook.
+    '''
+    payload = False
+
+    def call(self, record):
+        '''
+        @param record: L{Call} of a finished iControl call.
+        '''
+
+    def cache(self, collection, hits, misses):
+        '''
+        @param collection: object list name
+        @param hits: objects served from the cache
+        @param misses: objects loaded from the bigip
+        '''
+
+
+class LoggingHook(Hook):
+    '''
+    Log calls and cache lookups.
+    '''
+    def __init__(self, logger=None, level=logging.DEBUG, payload=False):
+        '''
+        @keyword logger: logger to use, defaults to the pybigip logger.
+        @keyword level: log level
+        @keyword payload: also log approximate payload sizes.
+        '''
+        self.log = logger or logging.getLogger('pybigip')
+        self.level = level
+        self.payload = payload
+
+    def call(self, record):
+        self.log.log(self.level, 'iControl %s.%s items=%d size=%s %.3fs%s',
+                     record.interface, record.method, record.items,
+                     record.size, record.seconds,
+                     ' failed: %s' % record.error if record.error else '')
+
+    def cache(self, collection, hits, misses):
+        self.log.log(self.level, 'cache %s hits=%d misses=%d', collection,
+                     hits, misses)
+
+
+class StatsdHook(Hook):
+    '''
+    Send timings and counters to statsd, using any client object with the
+    `timing(stat, ms)` and `incr(stat, count)` methods of the statsd
+    package.
+    '''
+    def __init__(self, client, prefix='pybigip'):
+        '''
+        @param client: statsd client
+        @keyword prefix: stat name prefix
+        '''
+        self.client = client
+        self.prefix = prefix
+
+    def call(self, record):
+        name = '%s.%s.%s' % (self.prefix, record.interface, record.method)
+        self.client.timing(name, record.seconds * 1000)
+        self.client.incr(name + '.items', record.items)
+
+        if record.error is not None:
+            self.client.incr(name + '.errors', 1)
+
+    def cache(self, collection, hits, misses):
+        name = '%s.cache.%s' % (self.prefix, collection)
+        self.client.incr(name + '.hits', hits)
+        self.client.incr(name + '.misses', misses)
+
+
+class Histogram(Hook):
+    '''
+    Aggregate calls in memory: totals and a latency histogram per method,
+    and cache hits and misses per object list.
+
+    @ivar methods: dict mapping (interface, method) to a dict with 'calls',
+        'items', 'size', 'seconds', 'errors' and 'buckets', the call count
+        per L{BUCKETS} upper bound plus one for slower calls. 'size' stays 0
+        unless payload sizes are measured.
+    @ivar caches: dict mapping object list names to a dict with 'hits'
+        and 'misses'.
+    '''
+    def __init__(self, buckets=BUCKETS, payload=False):
+        '''
+        @keyword buckets: sorted latency bucket upper bounds in seconds.
+        @keyword payload: also sum approximate payload sizes.
+        '''
+        self.buckets = tuple(buckets)
+        self.payload = payload
+        self.methods = dict()
+        self.caches = dict()
+        self._lock = threading.Lock()
+
+    def call(self, record):
+        key = (record.interface, record.method)
+
+        with self._lock:
+            stats = self.methods.get(key)
+
+            if stats is None:
+                stats = self.methods[key] = {
+                    'calls': 0, 'items': 0, 'size': 0, 'seconds': 0.0,
+                    'errors': 0, 'buckets': [0] * (len(self.buckets) + 1)}
+
+            stats['calls'] += 1
+            stats['items'] += record.items
+            stats['size'] += record.size or 0
+            stats['seconds'] += record.seconds
+            stats['errors'] += record.error is not None
+            stats['buckets'][bisect.bisect_left(self.buckets,
+                                                record.seconds)] += 1
+
+    def cache(self, collection, hits, misses):
+        with self._lock:
+            stats = self.caches.setdefault(collection,
+                                           {'hits': 0, 'misses': 0})
+            stats['hits'] += hits
+            stats['misses'] += misses
+
+    def _total(self, field):
+        return sum(s[field] for s in self.methods.itervalues())
+
+    @property
+    def round_trips(self):
+        return self._total('calls')
+
+    @property
+    def items(self):
+        return self._total('items')
+
+    @property
+    def size(self):
+        return self._total('size')
+
+    @property
+    def seconds(self):
+        '''
+        Summed call latency, more than the wall time with concurrent calls.
+        '''
+        return self._total('seconds')
+
+    def report(self):
+        '''
+        @return: human readable multi line summary.
+        '''
+        lines = ['%d round trips, %d items, %d bytes, %.3fs' % (
+                 self.round_trips, self.items, self.size, self.seconds)]
+
+        for (interface, method), stats in sorted(self.methods.iteritems()):
+            lines.append('  %s.%s: %d calls, %d items, %.3fs' % (
+                    interface, method, stats['calls'], stats['items'],
+                    stats['seconds']))
+
+        for collection, stats in sorted(self.caches.iteritems()):
+            lines.append('  cache %s: %d hits, %d misses' % (
+                    collection, stats['hits'], stats['misses']))
+
+        return '\n'.join(lines)
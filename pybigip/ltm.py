@@ -2,9 +2,114 @@
 
 '''
 
+import threading
+import time
+from array import array
 from copy import copy
 from itertools import chain, izip
-from pybigip import core
+from pybigip import batch, core
+
+
+MEMBER_FIELDS = {
+    'status': ('_status', 'get_member_object_status'),
+    'ip': ('_ip', 'get_member_address'),
+    'priority': ('_priority', 'get_member_priority'),
+}
+
+AVAILABILITY = ['AVAILABILITY_STATUS_NONE',
+                'AVAILABILITY_STATUS_GREEN',
+                'AVAILABILITY_STATUS_YELLOW',
+                'AVAILABILITY_STATUS_RED',
+                'AVAILABILITY_STATUS_BLUE',
+                'AVAILABILITY_STATUS_GRAY']
+
+ENABLED = ['ENABLED_STATUS_NONE',
+           'ENABLED_STATUS_ENABLED',
+           'ENABLED_STATUS_DISABLED',
+           'ENABLED_STATUS_DISABLED_BY_PARENT']
+
+_enum_lock = threading.Lock()
+
+
+def uint64(value):
+    '''
+    Decode an iControl ULong64 counter.
+
+    @param value: dict with 'high' and 'low' 32 bit halves
+    @return: int
+    '''
+    return (value['high'] << 32) | value['low']
+
+
+def decode_statistics(statistics):
+    '''
+    Decode a list of iControl Statistic structures.
+
+    @param statistics: list of dicts with 'type' and 'value'
+    @return: dict mapping statistic type to int
+    '''
+    return dict((s['type'], uint64(s['value'])) for s in statistics)
+
+
+def join_statistics(results):
+    '''
+    Merge chunked replies of get_statistics style calls, which return one
+    structure holding a 'statistics' list rather than a list per item.
+
+    @param results: list of statistics structures
+    @return: statistics structure
+    '''
+    return {'statistics': list(chain.from_iterable(r['statistics']
+                                                   for r in results)),
+            'time_stamp': results[0]['time_stamp']}
+
+
+STAT_COUNTERS = (
+    ('bits_in', 'STATISTIC_SERVER_SIDE_BYTES_IN', 8),
+    ('bits_out', 'STATISTIC_SERVER_SIDE_BYTES_OUT', 8),
+    ('packets_in', 'STATISTIC_SERVER_SIDE_PACKETS_IN', 1),
+    ('packets_out', 'STATISTIC_SERVER_SIDE_PACKETS_OUT', 1),
+    ('connections', 'STATISTIC_SERVER_SIDE_TOTAL_CONNECTIONS', 1),
+)
+
+STAT_GAUGES = (
+    ('current_connections', 'STATISTIC_SERVER_SIDE_CURRENT_CONNECTIONS'),
+)
+
+
+def encode(table, value):
+    '''
+    Get the small integer code of an iControl enum value read from the
+    bigip, unknown values (eg. from a newer bigip version) are added to
+    `table`.
+
+    @param table: list of enum values, eg. L{AVAILABILITY}
+    @param value: enum value
+    @return: index of value in table
+    '''
+    try:
+        return table.index(value)
+    except ValueError:
+        with _enum_lock:
+            if value not in table:
+                table.append(value)
+
+            return table.index(value)
+
+
+def lookup(table, value):
+    '''
+    Get the small integer code of a known iControl enum value.
+
+    @param table: list of enum values, eg. L{AVAILABILITY}
+    @param value: enum value
+    @return: index of value in table
+    @raise ValueError: for unknown values.
+    '''
+    try:
+        return table.index(value)
+    except ValueError:
+        raise ValueError('unknown enum value %r' % value)
 
 
 class VirtualAddress(object):
@@ -18,12 +123,19 @@ class VirtualAddress(object):
         state['_lcon'] = None
         return state
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._con = core.attached_connection()
+
     def __init__(self, con, name):
         ''' '''
         self._con = con
-        self._lcon = con.LocalLB.VirtualAddressV2
         self.name = name
 
+    @property
+    def _lcon(self):
+        return self._con.LocalLB.VirtualAddressV2
+
     @property
     def ip(self):
         '''
@@ -47,13 +159,20 @@ class VirtualServer(object):
         state['_lcon'] = None
         return state
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._con = core.attached_connection()
+
     def __init__(self, con, name):
         '''
         '''
         self._con = con
-        self._lcon = self._con.LocalLB.VirtualServer
         self.name = name
 
+    @property
+    def _lcon(self):
+        return self._con.LocalLB.VirtualServer
+
     @property
     def destination(self):
         '''
@@ -93,8 +212,18 @@ class VirtualServer(object):
     def pool(self, new):
         '''
         '''
+        writes = batch.WriteBatch(self._con)
+        writes.set_vip_pool(self, new)
+        writes.commit()
+
+    def _pool_changed(self, new):
+        '''
+        Update caches after the default pool was changed on the bigip.
+        '''
+        old = self._pool
         self._pool = new
-        self._lcon.set_default_pool_name([self.name], [new.name])
+        VirtualServers(self._con).move_pool_index(
+                self, old.name if old else None, new.name)
 
 @core.memoize
 class VirtualServers(core.ObjectList):
@@ -102,6 +231,10 @@ class VirtualServers(core.ObjectList):
     Class for managing the VIPs on the bigip.
     '''
     klass = VirtualServer
+    field_loaders = {'_destination': 'load_all_destinations',
+                     '_pool': 'load_all_pools',
+                     '_address': 'load_all_addresses'}
+    _by_pool = None
 
     def __getstate__(self):
         state = copy(self.__dict__)
@@ -109,21 +242,176 @@ class VirtualServers(core.ObjectList):
         state['_lcon'] = None
         return state
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._con = core.attached_connection()
+
     @property
     def _lcon(self):
         return self._con.LocalLB.VirtualServer
 
     def to_list(self):
-        return [v.to_dict() for v in self._objects]
+        return [v.to_dict() for v in self._objects.values()]
+
+    def load(self, names, deep=False):
+        '''
+        Read virtual servers from bigip.
+
+        @param names: VIP names
+        @keyword deep: Preload destination, default pool and virtual address
+            ip for every VIP with one array call each.
+        @return: list of L{VirtualServer} objects
+        '''
+        vips = [VirtualServer(self._con, n) for n in names]
+
+        if deep:
+            self.load_all_destinations(vips)
+            self.load_all_pools(vips)
+            self.load_all_addresses(vips)
+
+        return vips
+
+    def load_all_destinations(self, vips):
+        '''
+        Load destination information for all VIPs in `vips` in one call to
+        the LTM.
+        '''
+        missing = [v for v in vips if v._destination is None]
+
+        if not missing:
+            return
+
+        dests = self._con.call_chunked(self._lcon.get_destination_v2,
+                                       [v.name for v in missing])
+
+        for vip, dest in izip(missing, dests):
+            vip._destination = dest
+
+    def load_all_pools(self, vips):
+        '''
+        Load the default pool name for all VIPs in `vips` in one call to the
+        LTM.
+        '''
+        missing = [v for v in vips if v._pool is None]
+
+        if not missing:
+            return
+
+        names = self._con.call_chunked(self._lcon.get_default_pool_name,
+                                       [v.name for v in missing])
+
+        for vip, name in izip(missing, names):
+            vip._pool = Pool(self._con, name)
+
+    def load_all_addresses(self, vips):
+        '''
+        Load the virtual address ip for all VIPs in `vips` in one call to the
+        LTM. VIPs sharing a destination address share one L{VirtualAddress}.
+        '''
+        self.load_all_destinations(vips)
+        addresses = dict()
+
+        for vip in vips:
+            if vip._address is not None:
+                addresses.setdefault(vip._address.name, vip._address)
+
+        for vip in vips:
+            if vip._address is None:
+                name = vip._destination['address']
+
+                if name not in addresses:
+                    addresses[name] = VirtualAddress(self._con, name)
+
+                vip._address = addresses[name]
+
+        missing = [a for a in addresses.itervalues() if a._ip is None]
+
+        if not missing:
+            return
+
+        ips = self._con.call_chunked(
+                self._con.LocalLB.VirtualAddressV2.get_address,
+                [a.name for a in missing])
+
+        for address, ip in izip(missing, ips):
+            address._ip = ip
+
+    def _pool_index(self):
+        '''
+        Lazy build the reverse index from pool name to virtual servers. The
+        default pool of every VIP without one cached is read with a single
+        get_default_pool_name call.
+
+        @return: dict mapping pool name to list of L{VirtualServer} objects.
+        '''
+        if self._by_pool is None:
+            vips = self.get_all()
+            self.load_all_pools(vips)
+            index = dict()
+
+            for vip in vips:
+                index.setdefault(vip._pool.name, list()).append(vip)
+
+            self._by_pool = index
+
+        return self._by_pool
+
+    def _loaded(self, names):
+        self.invalidate_pool_index()
+
+    def invalidate_pool_index(self):
+        '''
+        Drop the pool index, it will be rebuilt on the next lookup.
+        '''
+        self._by_pool = None
+
+    def move_pool_index(self, vip, old, new):
+        '''
+        Update the pool index after the default pool of a VIP changed.
+
+        @param vip: L{VirtualServer} object, the cached VIP of the same
+            name is updated when it is another instance.
+        @param old: previous pool name, or None when unknown.
+        @param new: new pool name
+        '''
+        if vip.name in self._objects:
+            cached = self._objects[vip.name]
+
+            if cached is not vip:
+                cached._pool = vip._pool
+                vip = cached
+
+        if self._by_pool is None:
+            return
+
+        # A VIP not read from the cache may not know its previous pool.
+        lists = [old] if old is not None else self._by_pool.keys()
+
+        for name in lists:
+            if name in self._by_pool:
+                self._by_pool[name] = [v for v in self._by_pool[name]
+                                       if v.name != vip.name]
+
+        self._by_pool.setdefault(new, list()).append(vip)
+
+    def vips_by_pool(self, name):
+        '''
+        Get every virtual server using a pool as its default pool.
+
+        @param name: pool name
+        @return: list of L{VirtualServer} objects
+        '''
+        return list(self._pool_index().get(name, ()))
 
 
 @core.memoize
-class Pools(object):
+class Pools(core.ObjectList):
     '''
     Class for managing the pools on the bigip.
     '''
-    _names = None
     _all = False
+    _by_address = None
+    _stats = None
 
     def __getstate__(self):
         state = copy(self.__dict__)
@@ -131,15 +419,25 @@ class Pools(object):
         state['_lcon'] = None
         return state
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._con = core.attached_connection()
+
+        # Status is runtime state, never trust a restored copy.
+        for pool in self._objects.values():
+            pool._clear_status()
+
     def __init__(self, con):
         '''
         Setup pool.
 
         @param con: bigsuds connection object
         '''
-        self._con = con
-        self._lcon = self._con.LocalLB.Pool
-        self._pools = dict()
+        core.ObjectList.__init__(self, con)
+
+    @property
+    def _lcon(self):
+        return self._con.LocalLB.Pool
 
     def add(self, pool):
         '''
@@ -155,16 +453,12 @@ class Pools(object):
 
         @param pools:
         '''
-        names = list()
-        methods = list()
-        members = list()
+        writes = batch.WriteBatch(self._con)
 
         for pool in pools:
-            names.append(pool.name)
-            methods.append(pool.method)
-            members.append([m.to_dict() for m in pool.members])
+            writes.create_pool(pool)
 
-        self._con.create_v2(names, methods, members)
+        writes.commit()
 
     def remove(self, pool):
         '''
@@ -174,7 +468,35 @@ class Pools(object):
     def remove_multi(self, pools):
         '''
         '''
-        self._lcon.delete_pool([p.name for p in pools])
+        writes = batch.WriteBatch(self._con)
+
+        for pool in pools:
+            writes.delete_pool(pool)
+
+        writes.commit()
+
+    def _created(self, pools):
+        '''
+        Add pools created on the bigip to the cache.
+        '''
+        self._objects.update(pools, self._marker)
+
+        if self._names is not None:
+            self._names = self._names + [p.name for p in pools
+                                         if p.name not in self._names]
+
+        self.invalidate_address_index()
+
+    def _deleted(self, names):
+        '''
+        Drop pools deleted on the bigip from the cache.
+        '''
+        self._objects.remove(names)
+
+        if self._names is not None:
+            self._names = [n for n in self._names if n not in names]
+
+        self.invalidate_address_index()
 
     def get(self, name, nocache=False, deep=False):
         '''
@@ -189,9 +511,16 @@ class Pools(object):
         '''
         Get list of all pools.
 
+        @keyword nocache: Reload pools changed since the last config change
+            and reset the pool and member status of every pool, with `deep`
+            the member status is re-read in one batch.
+        @keyword deep: Preload member ips and status, also filling in what
+            cached pools are missing.
         @return: List of Pool objects
         '''
-        return self.get_multi(self.names, nocache, deep)
+        start = time.time()
+        pools = core.ObjectList.get_all(self, nocache, deep)
+        return self._reload_status(pools, nocache, deep, start)
 
     def get_multi(self, names, nocache=False, deep=False):
         '''
@@ -199,28 +528,40 @@ class Pools(object):
 
         @param names:
         @keyword deep:
-        @keyword nocache:
+        @keyword nocache: see L{get_all}
         @return: List of Pool objects
         '''
-        missing = list()
-        pools = list()
+        start = time.time()
+        pools = core.ObjectList.get_multi(self, names, nocache, deep)
+        return self._reload_status(pools, nocache, deep, start)
 
-        if nocache:
-            missing = names
-        else:
-            for name in names:
-                try:
-                    pools.append(self._pools[name])
-                except KeyError:
-                    missing.append(name)
+    def _reload_status(self, pools, reload, deep, start):
+        '''
+        Pool and member status are runtime state the config marker does not
+        track, so reloads reset them on cached pools. Deep reloads re-read
+        member status for every member not loaded since `start`, and deep
+        lookups load the member data cached pools are missing, eg. pools
+        loaded shallow or restored from a L{diskcache}.
+        '''
+        if reload:
+            for pool in pools:
+                if deep:
+                    pool._status = None
+                else:
+                    pool._clear_status()
 
-        if missing:
-            temp = self.load(missing, deep)
-            pools += temp
-            self._pools.update(dict(((p.name, p) for p in temp)))
+            if deep:
+                self.refresh(('status',), max_age=time.time() - start,
+                             pools=pools)
+
+        if deep:
+            self.refresh(('ip', 'status'), pools=pools)
 
         return pools
 
+    def _loaded(self, names):
+        self.invalidate_address_index()
+
     def load(self, names, deep=False):
         '''
         Read pool from bigip.
@@ -228,13 +569,12 @@ class Pools(object):
         @param names: Pool names
         @return: list of Pool object
         '''
-        print "calling get_member_v2(%s...[%d])" % (repr(names)[:70], len(repr(names)))
-        members = self._lcon.get_member_v2(names)
+        members = self._con.call_chunked(self._lcon.get_member_v2, names)
         ret = list()
 
         for name, members in izip(names, members):
             pool = Pool(self._con, name)
-            pool._members = [Member(self._con, pool=pool, **m) for m in members]
+            pool._store = MemberStore(members)
             ret.append(pool)
 
         if deep:
@@ -243,83 +583,174 @@ class Pools(object):
 
         return ret
 
-    @property
-    def names(self): 
+    def load_all_status(self, pools):
         '''
-        Lazy load names of pools on the bigip.
+        Load the status of `pools` with one chunked get_object_status call.
 
-        @return list of pool names.
+        @param pools: list of L{Pool} objects
         '''
-        if not self._names:
-            self._names = self._lcon.get_list()
+        statuses = self._con.call_chunked(self._lcon.get_object_status,
+                                          [p.name for p in pools])
 
-        return self._names
+        for pool, status in izip(pools, statuses):
+            pool._status = status
 
     def load_all_member_ips(self, pools):
         '''
         Load member ip information for all members of this pool in one
         call to the LTM.
         '''
-        load = list()
-        names = list()
+        self.refresh(('ip',), pools=pools)
 
-        for i, pool in enumerate(pools):
-            temp = list() 
+    def load_all_member_status(self, pools=None):
+        '''
+        Load memer status information for all members of the pools specified in
+        `pools`
+        '''
+        self.refresh(('status',), pools=pools)
 
-            for j, member in enumerate(pool.members):
-                if not member._ip:
-                    temp.append({'member': member.to_dict(),
-                                 'pindex': i,
-                                 'mindex': j})
+    def refresh(self, fields=('status', 'ip', 'priority'), max_age=None,
+                pools=None):
+        '''
+        Refresh member data across pools, fetching only what is stale. A
+        member field is stale when it was never loaded or, with `max_age`,
+        was loaded more than `max_age` seconds ago. Each field is fetched
+        for every stale member with one batched get_member_* call.
 
-            if temp:
-                names.append(pool.name)
-                load.append(temp)
+        @keyword fields: member fields to refresh, keys of L{MEMBER_FIELDS}.
+        @keyword max_age: maximum age in seconds of cached values, None to
+            only load missing values and 0 to reload everything.
+        @keyword pools: list of L{Pool} objects, defaults to every cached
+            pool.
+        @return: dict mapping each field to a dict with the number of
+            'fetched' and 'cached' members.
+        '''
+        if pools is None:
+            pools = self._objects.values()
 
-        if not load:
-            return
+        report = dict()
 
-        addresses = [[x['member'] for x in y] for y in load]
-        print "calling get_member_address(%s...)" % repr(addresses)[:70]
-        ips = self._lcon.get_member_address(names, addresses)
+        for field in fields:
+            attr, method = MEMBER_FIELDS[field]
+            now = time.time()
+            names = list()
+            load = list()
+            fetched = cached = 0
 
-        for i, members in enumerate(ips):
-            for j, ip in enumerate(members):
-                member = load[i][j]
-                pools[member['pindex']].members[member['mindex']]._ip = ip
+            for pool in pools:
+                stale = list()
 
-    def load_all_member_status(self, pools=None):
-        '''
-        Load memer status information for all members of the pools specified in
-        `pools`
+                for store, rows in pool._segments():
+                    found = store.stale_rows(attr, max_age, now, rows)
+                    cached += (len(store) if rows is None else len(rows)) - \
+                              len(found)
+
+                    if found:
+                        stale.append((store, found))
+
+                if stale:
+                    names.append(pool.name)
+                    load.append(stale)
+
+            if load:
+                dicts = [[d for store, rows in segments
+                          for d in store.to_dicts(rows)]
+                         for segments in load]
+                weights = [len(d) for d in dicts]
+                fetched = sum(weights)
+                values = self._con.call_chunked(
+                        getattr(self._lcon, method), names, dicts,
+                        weights=weights)
+
+                for segments, pool_values in izip(load, values):
+                    pool_values = iter(pool_values)
+
+                    for store, rows in segments:
+                        for i, value in izip(rows, pool_values):
+                            store.set_field(i, attr, value, now)
+
+            report[field] = {'fetched': fetched, 'cached': cached}
+
+        return report
+
+    def snapshot(self, max_age=None, pools=None):
         '''
-        load = list()
-        names = list()
+        Get a columnar table of every member's status, see L{MemberTable}.
+        Status and ip data older than `max_age` are refreshed first with
+        batched calls, see L{refresh}.
 
+        @keyword max_age: maximum age in seconds of cached member data.
+        @keyword pools: list of L{Pool} objects, defaults to all pools.
+        @return: L{MemberTable}
+        '''
         if pools is None:
-            pools = self._pools.values()
+            pools = self.get_all()
+
+        self.refresh(('status', 'ip'), max_age, pools)
+        return MemberTable.from_pools(pools)
+
+    def collect_stats(self, names=None, interval=None, members=True):
+        '''
+        Sample pool and member traffic statistics for many pools with
+        chunked get_statistics/get_all_member_statistics calls, and compute
+        per second rates against the previous sample.
+
+        @keyword names: pool names, defaults to every pool.
+        @keyword interval: minimum seconds between samples, a call within
+            `interval` of the last sample taken with the same arguments
+            returns it without calling the bigip.
+        @keyword members: also sample member statistics.
+        @return: L{StatsTable}
+        '''
+        now = time.time()
+        key = (None if names is None else tuple(names), bool(members))
+
+        if self._stats is None:
+            self._stats = dict()
+
+        last = self._stats.get(key)
+
+        if interval and last is not None and now - last.timestamp < interval:
+            return last
+
+        names = self.names if names is None else names
+        table = StatsTable(now)
+        pool_stats = self._con.call_chunked(self._lcon.get_statistics, names,
+                                            join=join_statistics)
+
+        for entry in pool_stats['statistics']:
+            table.add(entry['pool_name'], None, None,
+                      decode_statistics(entry['statistics']))
+
+        if members:
+            member_stats = self._con.call_chunked(
+                    self._lcon.get_all_member_statistics, names,
+                    weights=[self._member_count(n) for n in names])
+
+            for name, stats in izip(names, member_stats):
+                for entry in stats['statistics']:
+                    table.add(name, entry['member']['address'],
+                              entry['member']['port'],
+                              decode_statistics(entry['statistics']))
 
-        for i, pool in enumerate(pools):
-            temp = list()
+        if last is not None:
+            table.compute_rates(last)
 
-            for j, member in enumerate(pool.members):
-                if not member._status:
-                    add = {'member': member.to_dict(),
-                                 'pindex': i,
-                                 'mindex': j}
-                    temp.append(add)
+        self._stats[key] = table
+        return table
 
-            if temp:
-                names.append(pool.name)
-                load.append(temp)
+    def _member_count(self, name):
+        '''
+        @return: number of members of a cached pool, 1 when unknown, used
+            to size chunks of calls returning data per member.
+        '''
+        if name in self._objects:
+            store = self._objects[name]._store
 
-        members = [[x['member'] for x in y] for y in load]
-        statuses = self._lcon.get_member_object_status(names, members)
+            if store is not None:
+                return max(len(store), 1)
 
-        for i, members in enumerate(statuses):
-            for j, status in enumerate(members):
-                member = load[i][j]
-                pools[member['pindex']].members[member['mindex']]._status = status
+        return 1
 
     def all_ips(self): 
         '''
@@ -327,17 +758,71 @@ class Pools(object):
 
         @return: list of ip addresses
         '''
-        self.load_all_member_ips()
-        ip_gen = (x.ips() for x in self.pools.itervalues())
+        pools = self.get_all()
+        self.load_all_member_ips(pools)
+        ip_gen = (x.ips() for x in pools)
         return list(set(chain.from_iterable(ip_gen)))
 
+    def _address_index(self):
+        '''
+        Lazy build the reverse index from member ip address to pool members.
+        Every pool and member ip is fetched with batched calls the first time
+        the index is needed.
+
+        @return: dict mapping ip address to list of L{Member} objects.
+        '''
+        if self._by_address is None:
+            pools = self.get_all()
+            self.load_all_member_ips(pools)
+            index = dict()
+
+            for pool in pools:
+                for member in pool.members:
+                    index.setdefault(member._ip, list()).append(member)
+
+            self._by_address = index
+
+        return self._by_address
+
+    def invalidate_address_index(self):
+        '''
+        Drop the member ip index, it will be rebuilt on the next lookup.
+        '''
+        self._by_address = None
+
+    def members_by_address(self, address):
+        '''
+        Get every pool member whose node has the given ip address.
+
+        @param address: ip address
+        @return: list of L{Member} objects
+        '''
+        return list(self._address_index().get(address, ()))
+
+    def pools_by_address(self, address):
+        '''
+        Get every pool with a member whose node has the given ip address.
+
+        @param address: ip address
+        @return: list of L{Pool} objects
+        '''
+        pools = list()
+        seen = set()
+
+        for member in self._address_index().get(address, ()):
+            if member.pool.name not in seen:
+                seen.add(member.pool.name)
+                pools.append(member.pool)
+
+        return pools
+
 
 class Pool(object):
     '''
     Pool representation
     '''
     _members = None
-    _vips = None
+    _store = None
     _status = None
 
     def __getstate__(self):
@@ -346,6 +831,10 @@ class Pool(object):
         state['_lcon'] = None
         return state
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._con = core.attached_connection()
+
     def __init__(self, con, name, members=None, method=None):
         '''
         @param con: bigsuds connection object
@@ -354,11 +843,18 @@ class Pool(object):
         @keyword method: load balancing method
         '''
         self._con = con
-        self._lcon = self._con.LocalLB.Pool
         self.name = name
         self._members = members
         self._method = method
 
+        for member in members or ():
+            if member.pool is None:
+                member.pool = self
+
+    @property
+    def _lcon(self):
+        return self._con.LocalLB.Pool
+
     @property
     def members(self):
         '''
@@ -366,12 +862,32 @@ class Pool(object):
 
         @return list of pool member dicts.
         '''
-        if not self._members:
-            members = self._lcon.get_member_v2([self.name])[0]
-            self._members = [Member(self._con, pool=self, **m) for m in members]
+        if self._members is None:
+            if self._store is None:
+                self._store = MemberStore(
+                        self._lcon.get_member_v2([self.name])[0])
+
+            self._members = [Member.view(self._con, self, self._store, i)
+                             for i in xrange(len(self._store))]
 
         return self._members
 
+    def _segments(self):
+        '''
+        Get the member rows of this pool without building L{Member} views.
+
+        @return: list of (L{MemberStore}, rows) tuples, rows None for every
+            row of the store. Pools built from standalone members have one
+            single row segment per member.
+        '''
+        if self._store is None and self._members is None:
+            self._store = MemberStore(self._lcon.get_member_v2([self.name])[0])
+
+        if self._store is not None:
+            return [(self._store, None)]
+
+        return [(m._store, [m._index]) for m in self._members]
+
     @property
     def method(self):
         '''
@@ -387,24 +903,53 @@ class Pool(object):
     def add_member(self, member):
         '''
         '''
-        self.add_member_multi(self, [member])
+        self.add_member_multi([member])
 
     def add_member_multi(self, members):
         '''
         '''
-        members = [m.to_dict() for m in self.members]
-        self._con.add_member_v2([self.name], members)
+        writes = batch.WriteBatch(self._con)
+        writes.add_members(self, members)
+        writes.commit()
 
     def remove_member(self, member):
         '''
         '''
-        self.remove_member_multi(self, [member])
+        self.remove_member_multi([member])
 
     def remove_member_multi(self, members):
         '''
         '''
-        member_dicts = [m.to_dict() for m in members]
-        self._lcon.remove_member_v2([self.name], member_dicts)
+        writes = batch.WriteBatch(self._con)
+        writes.remove_members(self, members)
+        writes.commit()
+
+    def _created(self):
+        Pools(self._con)._created([self])
+
+    def _deleted(self):
+        Pools(self._con)._deleted([self.name])
+
+    def _clear_status(self):
+        '''
+        Forget the pool status and the status of every member, so they are
+        read again.
+        '''
+        self._status = None
+
+        if self._store is not None:
+            self._store.clear_status()
+        else:
+            for member in self._members or ():
+                member._status = None
+
+    def _members_changed(self):
+        '''
+        Drop cached members after the member list changed on the bigip.
+        '''
+        self._members = None
+        self._store = None
+        Pools(self._con).invalidate_address_index()
 
     def statistics(self):
         '''
@@ -429,7 +974,6 @@ class Pool(object):
         @return:
         '''
         if nocache or not self._status:
-            print "calling get_object_status(%r)" % self.name
             self._status = self._lcon.get_object_status([self.name])[0]
 
         return self._status
@@ -455,58 +999,472 @@ class Pool(object):
         Load member status information for all members of this pool in one
         call to the LTM.
         '''
-        load = list()
-
-        for i, member in enumerate(self.members):
-            if nocache or not member._status:
-                load.append({'member': member.to_dict(),
-                             'index': i})
-
-        stats = self._lcon.get_member_object_status([self.name,],
-            [[x['member'] for x in load]])
-
-        for i, status in enumerate(stats[0]):
-            self.members[load[i]['index']]._status = status
+        Pools(self._con).refresh(('status',), 0 if nocache else None, [self])
 
     def load_all_member_ips(self, nocache=False):
         '''
         Load member ip information for all members of this pool in one
         call to the LTM.
         '''
-        self.pool.load_all_member_ips([self.name,], nocache)
+        Pools(self._con).refresh(('ip',), 0 if nocache else None, [self])
 
     @property
     def virtual_servers(self):
-        if self._vips is None:
-            self._vips = list()
-            all_vips = VirtualServers(self._con).get_all()
-            for vip in all_vips:
-                if vip.pool.name == self.name:
-                    self._vips.append(vip)
+        '''
+        Virtual servers using this pool as their default pool, answered from
+        the shared L{VirtualServers} pool index.
+
+        @return: list of L{VirtualServer} objects
+        '''
+        return VirtualServers(self._con).vips_by_pool(self.name)
+
+
+class MemberStore(object):
+    '''
+    Columnar storage for the members of one pool. Status enums are kept as
+    codes into L{AVAILABILITY} and L{ENABLED}, -1 when not loaded.
+    '''
+    __slots__ = ('address', 'port', 'ip', 'availability', 'enabled',
+                 'description', 'priority', 'fetched')
+
+    def __init__(self, members=()):
+        '''
+        @keyword members: list of iControl member dicts (address, port).
+        '''
+        self.address = [m['address'] for m in members]
+        self.port = array('l', (m['port'] for m in members))
+        self.ip = [None] * len(self.address)
+        self.availability = array('b', [-1] * len(self.address))
+        self.enabled = array('b', [-1] * len(self.address))
+        self.description = [None] * len(self.address)
+        self.priority = [None] * len(self.address)
+        self.fetched = dict()
+
+    def __getstate__(self):
+        return dict((k, getattr(self, k)) for k in self.__slots__)
+
+    def __setstate__(self, state):
+        for k, v in state.iteritems():
+            setattr(self, k, v)
+
+    def __len__(self):
+        return len(self.address)
+
+    def append(self, address, port):
+        '''
+        Add a member row.
+
+        @return: row index
+        '''
+        for column in self.fetched.itervalues():
+            column.append(0)
+
+        self.address.append(address)
+        self.port.append(port)
+        self.ip.append(None)
+        self.availability.append(-1)
+        self.enabled.append(-1)
+        self.description.append(None)
+        self.priority.append(None)
+        return len(self.address) - 1
+
+    def get_status(self, i):
+        '''
+        @return: iControl object status dict of row `i`, or None.
+        '''
+        if self.availability[i] < 0:
+            return None
+
+        return {'availability_status': AVAILABILITY[self.availability[i]],
+                'enabled_status': ENABLED[self.enabled[i]],
+                'status_description': self.description[i]}
+
+    def set_status(self, i, status):
+        '''
+        Store an iControl object status dict in row `i`, None to clear it.
+        '''
+        if status is None:
+            self.availability[i] = self.enabled[i] = -1
+            self.description[i] = None
+            return
+
+        self.availability[i] = encode(AVAILABILITY,
+                                      status['availability_status'])
+        self.enabled[i] = encode(ENABLED, status['enabled_status'])
+        self.description[i] = status['status_description']
+
+    def clear_status(self):
+        '''
+        Forget the status of every row, so it is read again.
+        '''
+        self.availability = array('b', [-1] * len(self.address))
+        self.enabled = array('b', [-1] * len(self.address))
+        self.description = [None] * len(self.address)
+        self.fetched.pop('_status', None)
+
+    def stale_rows(self, attr, max_age=None, now=None, rows=None):
+        '''
+        Find rows whose field `attr` was never loaded or, with `max_age`, was
+        loaded more than `max_age` seconds ago.
+
+        @param attr: field attribute, eg. '_status'
+        @keyword max_age: maximum age in seconds, None to only find rows
+            where the field is not loaded.
+        @keyword now: current time, defaults to now.
+        @keyword rows: row indexes to check, defaults to every row.
+        @return: list of row indexes
+        '''
+        rows = xrange(len(self.address)) if rows is None else rows
+
+        if attr == '_status':
+            column = self.availability
+            missing = [i for i in rows if column[i] < 0]
+        else:
+            column = getattr(self, attr[1:])
+            missing = [i for i in rows if column[i] is None]
+
+        if max_age is None:
+            return missing
+
+        fetched = self.fetched.get(attr)
+
+        if fetched is None:
+            return list(rows)
+
+        limit = (time.time() if now is None else now) - max_age
+        missing = set(missing)
+        return [i for i in rows if i in missing or fetched[i] <= limit]
+
+    def set_field(self, i, attr, value, when):
+        '''
+        Store a value read from the bigip in field `attr` of row `i`.
+        '''
+        if attr == '_status':
+            self.set_status(i, value)
+        else:
+            getattr(self, attr[1:])[i] = value
+
+        self.touch(i, attr, when)
+
+    def to_dicts(self, rows):
+        '''
+        @return: list of iControl member dicts (address, port) of `rows`.
+        '''
+        return [{'address': self.address[i], 'port': self.port[i]}
+                for i in rows]
+
+    def touch(self, i, attr, when):
+        '''
+        Record when field `attr` of row `i` was read.
+        '''
+        if attr not in self.fetched:
+            self.fetched[attr] = array('d', [0]) * len(self.address)
+
+        self.fetched[attr][i] = when
+
+    def fetched_at(self, i, attr):
+        '''
+        @return: time field `attr` of row `i` was read, 0 if unknown.
+        '''
+        column = self.fetched.get(attr)
+        return column[i] if column is not None else 0
+
+
+class MemberTable(object):
+    '''
+    Columnar snapshot of pool member status. Every column is a sequence with
+    one entry per member: pool, address, port, ip, availability, enabled and
+    description. availability and enabled hold codes into L{AVAILABILITY}
+    and L{ENABLED}, -1 when unknown.
+    '''
+    columns = ('pool', 'address', 'port', 'ip', 'availability', 'enabled',
+               'description')
+
+    def __init__(self):
+        ''' '''
+        self.pool = list()
+        self.address = list()
+        self.port = array('l')
+        self.ip = list()
+        self.availability = array('b')
+        self.enabled = array('b')
+        self.description = list()
+
+    @classmethod
+    def from_pools(cls, pools):
+        '''
+        Build a table from the member stores of `pools`.
+
+        @param pools: list of L{Pool} objects
+        @return: L{MemberTable}
+        '''
+        table = cls()
+
+        for pool in pools:
+            for store, rows in pool._segments():
+                if rows is None:
+                    table.pool.extend([pool.name] * len(store))
+                    table.address.extend(store.address)
+                    table.port.extend(store.port)
+                    table.ip.extend(store.ip)
+                    table.availability.extend(store.availability)
+                    table.enabled.extend(store.enabled)
+                    table.description.extend(store.description)
+                    continue
+
+                for i in rows:
+                    table.pool.append(pool.name)
+                    table.address.append(store.address[i])
+                    table.port.append(store.port[i])
+                    table.ip.append(store.ip[i])
+                    table.availability.append(store.availability[i])
+                    table.enabled.append(store.enabled[i])
+                    table.description.append(store.description[i])
+
+        return table
+
+    def __len__(self):
+        return len(self.pool)
+
+    def rows(self):
+        '''
+        @return: generator of row dicts with enum codes decoded.
+        '''
+        for i in xrange(len(self)):
+            yield {'pool': self.pool[i],
+                   'address': self.address[i],
+                   'port': self.port[i],
+                   'ip': self.ip[i],
+                   'availability_status':
+                       AVAILABILITY[self.availability[i]]
+                       if self.availability[i] >= 0 else None,
+                   'enabled_status': ENABLED[self.enabled[i]]
+                       if self.enabled[i] >= 0 else None,
+                   'status_description': self.description[i]}
+
+    def count(self, by='pool', **where):
+        '''
+        Count members grouped by a column, optionally filtered on column
+        values. Enum filters may be given as codes or iControl names.
+
+        Example (down members per node):
+            >>> table.count('ip', availability='AVAILABILITY_STATUS_RED')
+
+        @keyword by: column to group on
+        @keyword where: column=value filters
+        @return: dict mapping column value to member count
+        @raise ValueError: for unknown enum names.
+        '''
+        filters = list()
+
+        for column, value in where.iteritems():
+            if column == 'availability' and isinstance(value, basestring):
+                value = lookup(AVAILABILITY, value)
+            elif column == 'enabled' and isinstance(value, basestring):
+                value = lookup(ENABLED, value)
+
+            filters.append((getattr(self, column), value))
+
+        keys = getattr(self, by)
+        counts = dict()
+
+        for i in xrange(len(self)):
+            for column, value in filters:
+                if column[i] != value:
+                    break
+            else:
+                counts[keys[i]] = counts.get(keys[i], 0) + 1
+
+        return counts
+
+    def down(self, by='pool'):
+        '''
+        Count members with a red availability status.
+
+        @keyword by: column to group on, eg. 'pool' or 'ip' for per node.
+        @return: dict mapping column value to down member count
+        '''
+        return self.count(by, availability=lookup(AVAILABILITY,
+                                                  'AVAILABILITY_STATUS_RED'))
+
+    def to_numpy(self):
+        '''
+        Convert the table to NumPy arrays, requires numpy.
+
+        @return: dict mapping column name to numpy array
+        '''
+        import numpy
+
+        return {'pool': numpy.array(self.pool, dtype=object),
+                'address': numpy.array(self.address, dtype=object),
+                'port': numpy.array(self.port, dtype=numpy.int32),
+                'ip': numpy.array(self.ip, dtype=object),
+                'availability': numpy.array(self.availability,
+                                            dtype=numpy.int8),
+                'enabled': numpy.array(self.enabled, dtype=numpy.int8),
+                'description': numpy.array(self.description, dtype=object)}
+
+
+class StatsTable(object):
+    '''
+    Columnar sample of pool and member statistics. Rows are pools (address
+    and port None) or pool members. `values` maps every name of
+    L{STAT_COUNTERS} and L{STAT_GAUGES} to a column of ints, bit counters
+    already scaled from bytes. `rates` maps every counter name to a column
+    of per second rates against the previous sample, None when unknown.
+    '''
+    def __init__(self, timestamp):
+        '''
+        @param timestamp: time the sample was taken.
+        '''
+        self.timestamp = timestamp
+        self.pool = list()
+        self.address = list()
+        self.port = list()
+        self.values = dict((c[0], list()) for c in STAT_COUNTERS + STAT_GAUGES)
+        self.rates = dict((c[0], list()) for c in STAT_COUNTERS)
+
+    def __len__(self):
+        return len(self.pool)
+
+    def add(self, pool, address, port, stats):
+        '''
+        Add a row.
+
+        @param stats: decoded statistics, see L{decode_statistics}.
+        '''
+        self.pool.append(pool)
+        self.address.append(address)
+        self.port.append(port)
+
+        for name, type, scale in STAT_COUNTERS:
+            self.values[name].append(stats.get(type, 0) * scale)
+            self.rates[name].append(None)
+
+        for name, type in STAT_GAUGES:
+            self.values[name].append(stats.get(type, 0))
+
+    def keys(self):
+        '''
+        @return: list of (pool, address, port) row keys.
+        '''
+        return zip(self.pool, self.address, self.port)
+
+    def compute_rates(self, previous):
+        '''
+        Fill the rate columns from the counter deltas to an earlier sample.
+        Rows missing from it, or whose counters went backwards (reset),
+        keep a None rate.
+
+        @param previous: earlier L{StatsTable}
+        '''
+        elapsed = self.timestamp - previous.timestamp
+
+        if elapsed <= 0:
+            return
+
+        index = dict((k, i) for i, k in enumerate(previous.keys()))
+
+        for i, key in enumerate(self.keys()):
+            j = index.get(key)
 
-        return self._vips
+            if j is None:
+                continue
+
+            for name, type, scale in STAT_COUNTERS:
+                delta = self.values[name][i] - previous.values[name][j]
+
+                if delta >= 0:
+                    self.rates[name][i] = delta / elapsed
+
+    def rows(self):
+        '''
+        @return: generator of row dicts with values and '<name>_rate' keys.
+        '''
+        for i, key in enumerate(self.keys()):
+            row = dict(zip(('pool', 'address', 'port'), key))
+
+            for name, column in self.values.iteritems():
+                row[name] = column[i]
+
+            for name, column in self.rates.iteritems():
+                row[name + '_rate'] = column[i]
+
+            yield row
 
 
 class Member(object):
     '''
-    Pool member representation
+    Pool member representation, a view of one row of a L{MemberStore}.
     '''
-    _status = None
-    _ip = None
+    __slots__ = ('_con', 'pool', '_store', '_index')
 
     def __getstate__(self):
-        state = copy(self.__dict__)
-        state['_con'] = None
-        state['_lcon'] = None
-        return state
+        return {'_con': None, 'pool': self.pool, '_store': self._store,
+                '_index': self._index}
+
+    def __setstate__(self, state):
+        for k, v in state.iteritems():
+            setattr(self, k, v)
+
+        self._con = core.attached_connection()
 
     def __init__(self, con, address, port, pool=None):
         ''' '''
         self._con = con
-        self._lcon = self._con.LocalLB.Pool
-        self.address = address
-        self.port = port
         self.pool = pool
+        self._store = MemberStore()
+        self._index = self._store.append(address, port)
+
+    @classmethod
+    def view(cls, con, pool, store, index):
+        '''
+        Create a member backed by row `index` of `store`.
+        '''
+        member = cls.__new__(cls)
+        member._con = con
+        member.pool = pool
+        member._store = store
+        member._index = index
+        return member
+
+    @property
+    def _lcon(self):
+        return self._con.LocalLB.Pool
+
+    @property
+    def address(self):
+        ''' '''
+        return self._store.address[self._index]
+
+    @property
+    def port(self):
+        ''' '''
+        return self._store.port[self._index]
+
+    @property
+    def _status(self):
+        return self._store.get_status(self._index)
+
+    @_status.setter
+    def _status(self, value):
+        self._store.set_status(self._index, value)
+
+    @property
+    def _ip(self):
+        return self._store.ip[self._index]
+
+    @_ip.setter
+    def _ip(self, value):
+        self._store.ip[self._index] = value
+
+    @property
+    def _priority(self):
+        return self._store.priority[self._index]
+
+    @_priority.setter
+    def _priority(self, value):
+        self._store.priority[self._index] = value
 
     def to_dict(self):
         '''
@@ -517,6 +1475,31 @@ class Member(object):
         '''
         return {'address': self.address, 'port': self.port}
 
+    def set_field(self, attr, value, when=None):
+        '''
+        Store a value read from the bigip in a cached field, recording when
+        it was read.
+
+        @param attr: field attribute, eg. '_status'
+        @param value: value to store
+        @keyword when: time the value was read, defaults to now.
+        '''
+        self._store.set_field(self._index, attr, value,
+                              time.time() if when is None else when)
+
+    def is_stale(self, attr, max_age=None, now=None):
+        '''
+        Check if a cached field needs to be read again.
+
+        @param attr: field attribute, eg. '_status'
+        @keyword max_age: maximum age in seconds, None to only check that the
+            field is loaded.
+        @keyword now: current time, defaults to now.
+        @return: bool
+        '''
+        return bool(self._store.stale_rows(attr, max_age, now,
+                                           [self._index]))
+
     def metadata(self):
         '''
         '''
@@ -527,8 +1510,8 @@ class Member(object):
         '''
         '''
         if not self._status or nocache:
-            self._status = self._lcon.get_member_object_status(
-                    [self.pool.name], [[self.to_dict()]])[0][0]
+            self.set_field('_status', self._lcon.get_member_object_status(
+                    [self.pool.name], [[self.to_dict()]])[0][0])
 
         return self._status
 
@@ -537,25 +1520,34 @@ class Member(object):
         '''
         '''
         if not self._ip:
-            self._ip = self._lcon.get_member_address(
-                    [self.pool.name], [[self.to_dict()]])[0][0]
+            self.set_field('_ip', self._lcon.get_member_address(
+                    [self.pool.name], [[self.to_dict()]])[0][0])
         return self._ip
 
     @property
     def priority(self):
         '''
-
+        Lazy load member priority.
         '''
-        return self._lcon.get_member_priority([self.pool.name],
-                                              [[self.to_dict()]])[0][0]
+        if self._priority is None:
+            self.set_field('_priority', self._lcon.get_member_priority(
+                    [self.pool.name], [[self.to_dict()]])[0][0])
+
+        return self._priority
 
     @priority.setter
     def priority(self, value):
         '''
         '''
-        self._lcon.set_member_priority([self.pool.name],
-                                       [[self.to_dict()]],
-                                       [[value]])
+        writes = batch.WriteBatch(self._con)
+        writes.set_member_priority(self, value)
+        writes.commit()
+
+    def _state_changed(self):
+        '''
+        Drop the cached status after the member state changed on the bigip.
+        '''
+        self._status = None
 
     @property
     def enabled(self):
@@ -574,75 +1566,46 @@ class Member(object):
         return self.status()['availability_status'] == 'AVAILABILITY_STATUS_GREEN'
 
 
-class Nodes(object):
+class Nodes(core.ObjectList):
     '''
     Node address representation
     '''
-    _names = None
-
     def __getstate__(self):
         state = copy(self.__dict__)
         state['_con'] = None
         state['_lcon'] = None
         return state
 
-    def __init__(self, con):
-        ''' '''
-        self._con = con
-        self._nodes = dict()
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._con = core.attached_connection()
 
     @property
     def _lcon(self):
         return self._con.LocalLB.NodeAddressV2
 
-    @property
-    def names(self):
-        ''' '''
-        if not self._names:
-            self._names = self._lcon.get_list()
-
-        return self._names
-
     def get(self, name, nocache=False):
         ''' '''
         return self.get_multi([name,], nocache)
 
     def get_all(self, nocache=False):
         ''' '''
-        return self.get_multi(self.names, nocache)
+        return core.ObjectList.get_all(self, nocache)
 
     def get_multi(self, names, nocache=False):
         ''' '''
-        missing = list()
-        nodes = list()
+        return core.ObjectList.get_multi(self, names, nocache)
 
-        if nocache:
-            missing = names
-        else:
-            for name in names:
-                try:
-                    nodes.append(self._nodes[name])
-                except KeyError:
-                    missing.append(name)
-
-        if missing:
-            temp = self.load(missing)
-            nodes += temp
-            self._nodes = dict(((n.name, n) for n in temp))
-
-        return nodes
-
-    def load(self, names):
+    def load(self, names, deep=False):
         '''
         '''
-        nodes = self._lcon.get_address(names)
+        nodes = self._con.call_chunked(self._lcon.get_address, names)
         return [Node(self._con, n, a) for n, a in izip(names, nodes)]
 
 
 class Node(object):
     '''
     '''
-    _pools = None
 
     def __getstate__(self):
         state = copy(self.__dict__)
@@ -650,6 +1613,10 @@ class Node(object):
         state['_lcon'] = None
         return state
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._con = core.attached_connection()
+
     def __init__(self, con, name, address):
         '''
         '''
@@ -659,12 +1626,20 @@ class Node(object):
 
     @property
     def pools(self):
-        if self._pools is None:
-            self._pools = list()
-            all_pools = Pools(self._con).get_all(deep=True)
+        '''
+        Pools with a member on this node, answered from the shared
+        L{Pools} address index.
 
-            for pool in all_pools:
-                if self.address in pool.ips():
-                    self._pools.append(pool)
+        @return: list of L{Pool} objects
+        '''
+        return Pools(self._con).pools_by_address(self.address)
+
+    @property
+    def members(self):
+        '''
+        Pool members on this node, answered from the shared L{Pools} address
+        index.
 
-        return self._pools
+        @return: list of L{Member} objects
+        '''
+        return Pools(self._con).members_by_address(self.address)
@@ -15,6 +15,9 @@ setup(
     packages=[
         'pybigip',
     ],
+    scripts=[
+        'bin/pybigip-exporter',
+    ],
     install_requires=[
         'bigsuds',
     ],